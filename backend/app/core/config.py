@@ -1,8 +1,11 @@
 """
 Configuration Management
 """
+from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Tuple
+
+__all__ = ['Settings', 'settings', 'get_settings', 'get_available_providers', 'validate_settings']
 
 
 class Settings(BaseSettings):
@@ -30,6 +33,7 @@ class Settings(BaseSettings):
     # OpenAI Model Configuration
     # Options: 'gpt-4o', 'gpt-4o-mini', 'gpt-4-turbo'
     OPENAI_MODEL: str = "gpt-4o-mini"  # Cost-effective default
+    OPENAI_BASE_URL: Optional[str] = None  # None = api.openai.com; set for proxies/compatible APIs
     
     # Data Source Selection
     # Options: 'rapidapi', 'scraperapi', 'mock'
@@ -55,6 +59,10 @@ class Settings(BaseSettings):
     # Future: gemini-2.5-flash or gemini-2.5-flash-lite (when available)
     GEMINI_GENERATION_MODEL: str = "gemini-2.0-flash-exp"
     
+    # Tiny Model: tried first for generation, escalating to the generation
+    # model when its comments fail validation (None = generation model only)
+    GEMINI_TINY_MODEL: Optional[str] = "gemini-1.5-flash-8b"
+    
     MAX_TOKENS: int = 3000  # Increased for complete JSON responses
     TEMPERATURE: float = 0.7
     
@@ -65,6 +73,13 @@ class Settings(BaseSettings):
     PROFILE_CACHE_DAYS: int = 7
     POST_CACHE_HOURS: int = 24
     COMMENT_CACHE_HOURS: int = 6
+    COMMENT_CACHE_DIR: Optional[str] = "~/.cache/linkedin-gen"  # None = memory only
+    SEMANTIC_CACHE_ENABLED: bool = False  # Needs sentence-transformers + faiss-cpu
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Min cosine similarity for a hit
+    SEMANTIC_CACHE_PATH: Optional[str] = "~/.cache/linkedin-gen/semantic.jsonl"
+    BATCH_POLL_INTERVAL: float = 30.0  # Seconds between Message Batch status checks
+    SINGLE_CALL_VARIATIONS: bool = False  # One Claude call returns every variation (fewer round-trips, less diversity)
+    TRUST_HUMANIZER: bool = False  # Humanized comments get a word-count-only check instead of full re-validation
     
     # Fetch Limits
     MAX_POSTS_FETCH: int = 30  # Posts from last 30 days
@@ -79,6 +94,11 @@ class Settings(BaseSettings):
     # Rate Limiting
     RAPIDAPI_RATE_LIMIT: int = 100  # per hour
     CLAUDE_RATE_LIMIT: int = 50  # per minute
+    ANTHROPIC_MAX_CONCURRENCY: int = 5  # In-flight Claude calls per process
+    ANTHROPIC_MAX_RETRIES: int = 5  # SDK retries 429/5xx with exponential backoff
+    OPENAI_MAX_CONCURRENCY: int = 5  # In-flight OpenAI calls per process
+    OPENAI_MAX_RETRIES: int = 5  # SDK retries 429/connection/5xx with jittered backoff
+    GEMINI_MAX_RETRIES: int = 2  # 429/503 retries (jittered backoff) before falling back
     
     # Application
     APP_NAME: str = "LinkedIn Comment Generator"
@@ -89,33 +109,54 @@ class Settings(BaseSettings):
         case_sensitive = True
 
 
-# Global settings instance
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build settings once per process (.env is parsed on first call only)"""
+    return Settings()
+
+
+class _LazySettings:
+    """Proxy that defers building Settings until a field is first read"""
+    
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+    
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
+
+# Global settings instance (resolved lazily through get_settings())
+settings = _LazySettings()
+
+
+@lru_cache(maxsize=1)
+def get_available_providers() -> Tuple[str, ...]:
+    """Labels of the configured AI providers (settings are fixed per process)"""
+    settings = get_settings()
+    providers = []
+    if settings.ANTHROPIC_API_KEY:
+        providers.append("Anthropic Claude")
+    if settings.OPENAI_API_KEY:
+        providers.append(f"OpenAI ({settings.OPENAI_MODEL})")
+    if settings.GEMINI_API_KEY:
+        providers.append(f"Gemini ({settings.GEMINI_GENERATION_MODEL})")
+    return tuple(providers)
 
 
 # Validation function for configuration
 def validate_settings():
     """Validate that required settings are configured"""
+    settings = get_settings()
     
     # Check AI providers
-    has_anthropic = bool(settings.ANTHROPIC_API_KEY)
-    has_openai = bool(settings.OPENAI_API_KEY)
-    has_gemini = bool(settings.GEMINI_API_KEY)
+    providers = get_available_providers()
     
-    if not (has_anthropic or has_openai or has_gemini):
+    if not providers:
         print("⚠️  WARNING: No AI provider configured!")
         print("   Please set at least one of: ANTHROPIC_API_KEY, OPENAI_API_KEY, or GEMINI_API_KEY")
         return False
     
     # Log available providers
-    providers = []
-    if has_anthropic:
-        providers.append("Anthropic Claude")
-    if has_openai:
-        providers.append(f"OpenAI ({settings.OPENAI_MODEL})")
-    if has_gemini:
-        providers.append(f"Gemini ({settings.GEMINI_GENERATION_MODEL})")
-    
     print(f"✓ Available AI providers: {', '.join(providers)}")
     
     # Check humanizer API (optional but recommended)
@@ -138,11 +179,3 @@ def validate_settings():
     
     return True
 
-
-# Run validation on import (can be disabled by setting env var)
-import os
-if os.getenv("SKIP_CONFIG_VALIDATION") != "true":
-    try:
-        validate_settings()
-    except Exception as e:
-        print(f"Configuration validation error: {e}")
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Shared Gemini Client
+Configures google-generativeai once per process and hands out one
+GenerativeModel per model name, so every service reuses the SDK's cached
+client (and its open channel) instead of building a fresh one
+"""
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from functools import lru_cache
+from app.core.config import settings
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Quota (429) and overload (503) errors usually clear within seconds
+RETRYABLE_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable)
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 20.0
+
+
+@lru_cache(maxsize=1)
+def _configure() -> None:
+    """genai.configure discards the SDK's cached clients, so run it only once"""
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+
+
+@lru_cache(maxsize=None)
+def get_generative_model(model_name: str) -> "genai.GenerativeModel":
+    """Process-wide GenerativeModel for model_name"""
+    _configure()
+    return genai.GenerativeModel(model_name)
+
+
+def generate_content(model: "genai.GenerativeModel", *args, **kwargs):
+    """model.generate_content, retrying 429/503 up to GEMINI_MAX_RETRIES times"""
+    for attempt in range(settings.GEMINI_MAX_RETRIES + 1):
+        try:
+            return model.generate_content(*args, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == settings.GEMINI_MAX_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"⏳ {model.model_name} {type(e).__name__}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Server's Retry-After when given, else exponential backoff plus jitter"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return min(BACKOFF_MAX, float(headers["Retry-After"]))
+    except (KeyError, TypeError, ValueError):
+        pass
+    return min(BACKOFF_MAX, BACKOFF_INITIAL * 2 ** attempt) + random.uniform(0, BACKOFF_INITIAL)
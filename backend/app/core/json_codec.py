@@ -0,0 +1,110 @@
+"""
+JSON Encoding/Decoding
+Uses orjson when installed (several times faster on model responses),
+falls back to the standard library otherwise
+"""
+from typing import Any, Callable, List, Optional, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON text (raises a json.JSONDecodeError subclass on bad input)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any, sort_keys: bool = False, default: Optional[Callable] = None) -> str:
+    """Serialize to compact JSON text"""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(value, default=default, option=option).decode()
+    return json.dumps(value, sort_keys=sort_keys, default=default, separators=(",", ":"))
+
+
+def extract_object(text: str) -> Optional[str]:
+    """
+    Return the first balanced {...} block in text, or None
+    Single forward scan: skips code fences and prose around the object,
+    and ignores braces inside string literals
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+class ObjectStreamScanner:
+    """
+    Incremental form of extract_object for streamed responses: feed() text
+    chunks as they arrive and get back every complete object opened at the
+    given nesting depth (2 for the items in {"comments": [{...}, ...]})
+    """
+    
+    def __init__(self, depth: int = 2):
+        self.depth = depth
+        self.text = ""
+        self._pos = 0
+        self._level = 0
+        self._in_string = False
+        self._escaped = False
+        self._item_start = None
+    
+    def feed(self, chunk: str) -> List[Any]:
+        """Append chunk; return the objects it completed (unparseable ones are skipped)"""
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                if ch == '{' and self._level == self.depth:
+                    self._item_start = i
+                self._level += 1
+            elif ch in '}]':
+                self._level -= 1
+                if ch == '}' and self._level == self.depth and self._item_start is not None:
+                    try:
+                        completed.append(loads(text[self._item_start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._item_start = None
+        self._pos = len(text)
+        return completed
@@ -0,0 +1,48 @@
+"""
+Shared OpenAI Client
+One AsyncOpenAI (and one httpx connection pool) per process and endpoint, so
+concurrent requests and generator instances reuse keep-alive connections
+instead of opening fresh TLS sessions
+"""
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+import httpx
+import threading
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=120.0)
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], AsyncOpenAI] = {}
+_lock = threading.Lock()
+
+
+def get_async_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> AsyncOpenAI:
+    """Process-wide async client for (api_key, base_url), from settings by default"""
+    key = (api_key or settings.OPENAI_API_KEY, base_url or settings.OPENAI_BASE_URL)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = AsyncOpenAI(
+                api_key=key[0],
+                base_url=key[1],
+                max_retries=settings.OPENAI_MAX_RETRIES,
+                timeout=TIMEOUT,
+                http_client=DefaultAsyncHttpxClient(limits=POOL_LIMITS, http2=HTTP2_AVAILABLE),
+            )
+    return client
+
+
+async def close_clients() -> None:
+    """Close every pooled client (server shutdown)"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        await client.close()
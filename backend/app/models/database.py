@@ -1,105 +1,158 @@
 """
 Database Models
 """
-from sqlalchemy import Column, Integer, String, Text, JSON, TIMESTAMP, ForeignKey, Float
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Text, DateTime, ForeignKey, Index, event, text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.sql import func
-from datetime import datetime
+from sqlalchemy.types import TypeDecorator
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Optional
 
-Base = declarative_base()
+from app.core import json_codec
+
+
+class FrozenJSON(TypeDecorator):
+    """
+    JSON stored as text (queryable through SQLite JSON1's json_extract)
+
+    Objects come back as read-only MappingProxyType views, so a loaded value
+    can be handed to the humanizer as-is without copying or re-parsing.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, MappingProxyType):
+            value = dict(value)
+        return json_codec.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        data = json_codec.loads(value)
+        return MappingProxyType(data) if isinstance(data, dict) else data
+
+
+class Base(DeclarativeBase):
+    """Declarative base for all models (SQLAlchemy 2.0 typed mappings)"""
+    pass
 
 
 class User(Base):
     """User profile cache"""
     __tablename__ = "users"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    linkedin_url = Column(String, unique=True, nullable=False, index=True)
-    name = Column(String)
-    headline = Column(String)
-    about = Column(Text)
-    experience = Column(JSON)  # List of experience objects
-    skills = Column(JSON)  # List of skills
-    writing_style = Column(JSON)  # Analyzed writing style
-    created_at = Column(TIMESTAMP, server_default=func.now())
-    updated_at = Column(TIMESTAMP, onupdate=func.now())
+    __mapper_args__ = {"eager_defaults": False}
+    __table_args__ = (
+        # Lookups by analyzed tone (SQLite JSON1 expression index)
+        Index("ix_users_tone", text("json_extract(writing_style, '$.tone')")),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    linkedin_url: Mapped[str] = mapped_column(unique=True, index=True)
+    name: Mapped[Optional[str]]
+    headline: Mapped[Optional[str]]
+    about: Mapped[Optional[str]] = mapped_column(Text)
+    experience: Mapped[Optional[Any]] = mapped_column(FrozenJSON)  # List of experience objects
+    skills: Mapped[Optional[Any]] = mapped_column(FrozenJSON)  # List of skills
+    writing_style: Mapped[Optional[Any]] = mapped_column(FrozenJSON)  # Analyzed writing style
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))  # set by before_update listener
 
 
 class UserComment(Base):
     """User's comment history for style learning"""
     __tablename__ = "user_comments"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    comment_text = Column(Text, nullable=False)
-    post_context = Column(Text)  # Brief context about the post
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    __mapper_args__ = {"eager_defaults": False}
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    comment_text: Mapped[str] = mapped_column(Text)
+    post_context: Mapped[Optional[str]] = mapped_column(Text)  # Brief context about the post
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
 class Target(Base):
     """Target profile cache"""
     __tablename__ = "targets"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    linkedin_url = Column(String, unique=True, nullable=False, index=True)
-    name = Column(String)
-    headline = Column(String)
-    about = Column(Text)
-    experience = Column(JSON)
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    __mapper_args__ = {"eager_defaults": False}
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    linkedin_url: Mapped[str] = mapped_column(unique=True, index=True)
+    name: Mapped[Optional[str]]
+    headline: Mapped[Optional[str]]
+    about: Mapped[Optional[str]] = mapped_column(Text)
+    experience: Mapped[Optional[Any]] = mapped_column(FrozenJSON)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
 class Post(Base):
     """LinkedIn posts"""
     __tablename__ = "posts"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    target_id = Column(Integer, ForeignKey("targets.id"), nullable=False)
-    post_url = Column(String, unique=True)
-    content = Column(Text, nullable=False)
-    media_type = Column(String)  # text, image, video, article, poll
-    posted_date = Column(TIMESTAMP)
-    likes_count = Column(Integer, default=0)
-    comments_count = Column(Integer, default=0)
-    sentiment = Column(JSON)  # Analyzed sentiment and themes
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    __mapper_args__ = {"eager_defaults": False}
+    __table_args__ = (
+        # Recent posts for a target ("posts from last 30 days")
+        Index("ix_posts_target_posted", "target_id", "posted_date"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    target_id: Mapped[int] = mapped_column(ForeignKey("targets.id"))  # covered by ix_posts_target_posted
+    post_url: Mapped[Optional[str]] = mapped_column(unique=True)
+    content: Mapped[str] = mapped_column(Text)
+    media_type: Mapped[Optional[str]]  # text, image, video, article, poll
+    posted_date: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    likes_count: Mapped[Optional[int]] = mapped_column(default=0)
+    comments_count: Mapped[Optional[int]] = mapped_column(default=0)
+    sentiment: Mapped[Optional[Any]] = mapped_column(FrozenJSON)  # Analyzed sentiment and themes
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
 class PostComment(Base):
     """Comments on posts (for analysis)"""
     __tablename__ = "post_comments"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
-    author_name = Column(String)
-    comment_text = Column(Text, nullable=False)
-    likes_count = Column(Integer, default=0)
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    __mapper_args__ = {"eager_defaults": False}
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    post_id: Mapped[int] = mapped_column(ForeignKey("posts.id"), index=True)
+    author_name: Mapped[Optional[str]]
+    comment_text: Mapped[str] = mapped_column(Text)
+    likes_count: Mapped[Optional[int]] = mapped_column(default=0)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
 class GeneratedComment(Base):
     """AI-generated comments"""
     __tablename__ = "generated_comments"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
-    comment_text = Column(Text, nullable=False)
-    variation_number = Column(Integer)  # 1, 2, or 3
-    confidence_score = Column(Float)  # 0.0 to 1.0
-    prompt_used = Column(Text)
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    __mapper_args__ = {"eager_defaults": False}
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    post_id: Mapped[int] = mapped_column(ForeignKey("posts.id"), index=True)
+    comment_text: Mapped[str] = mapped_column(Text)
+    variation_number: Mapped[Optional[int]]  # 1, 2, or 3
+    confidence_score: Mapped[Optional[float]]  # 0.0 to 1.0
+    prompt_used: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
 class APICall(Base):
     """API usage tracking"""
     __tablename__ = "api_calls"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    service = Column(String, nullable=False)  # 'rapidapi' or 'claude'
-    endpoint = Column(String)
-    tokens_used = Column(Integer, default=0)
-    cost = Column(Float, default=0.0)
-    success = Column(Integer, default=1)  # 1 = success, 0 = failure
-    error_message = Column(Text)
-    created_at = Column(TIMESTAMP, server_default=func.now())
\ No newline at end of file
+    __mapper_args__ = {"eager_defaults": False}
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    service: Mapped[str] = mapped_column(index=True)  # 'rapidapi' or 'claude'
+    endpoint: Mapped[Optional[str]]
+    tokens_used: Mapped[Optional[int]] = mapped_column(default=0)
+    cost: Mapped[Optional[float]] = mapped_column(default=0.0)
+    success: Mapped[Optional[int]] = mapped_column(default=1)  # 1 = success, 0 = failure
+    error_message: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+@event.listens_for(User, "before_update")
+def _touch_updated_at(mapper, connection, target):
+    """Stamp updated_at once per flush instead of a server-side onupdate"""
+    target.updated_at = datetime.now(timezone.utc)
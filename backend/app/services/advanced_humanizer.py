@@ -6,9 +6,34 @@ Implements natural writing patterns based on research:
 - Natural conversational markers
 - Authentic LinkedIn comment patterns
 """
+import itertools
 import random
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional, Union
+
+
+_SENT_RE = re.compile(r'[^.!?]+[.!?]*')
+
+
+def _split_sentences(text: str) -> List[str]:
+    """Split text into sentences in one scan, keeping each sentence's end punctuation"""
+    return [sent for sent in (m.group(0).strip() for m in _SENT_RE.finditer(text)) if sent]
+
+
+def _replacement_pattern(repl_map: Dict) -> re.Pattern:
+    """
+    One alternation over every key, longest first
+    
+    A phrase ending in a verb with its own "<verb> not" key ("I will", "it is")
+    is skipped when "not" follows, so the negation wins ("I won't", not "I'll not").
+    """
+    alternatives = []
+    for key in sorted(repl_map, key=len, reverse=True):
+        alternative = re.escape(key)
+        if ' ' in key and f"{key.rsplit(' ', 1)[1]} not" in repl_map:
+            alternative += r'(?!\s+not\b)'
+        alternatives.append(alternative)
+    return re.compile(r'\b(' + '|'.join(alternatives) + r')\b', re.IGNORECASE)
 
 
 class AdvancedHumanizer:
@@ -21,7 +46,7 @@ class AdvancedHumanizer:
     """
     
     # Natural conversation starters (real LinkedIn patterns)
-    NATURAL_STARTERS = [
+    NATURAL_STARTERS = (
         "",  # No starter (most natural)
         "Honestly,",
         "Real talk -",
@@ -29,11 +54,11 @@ class AdvancedHumanizer:
         "Tbh,",
         "Yeah,",
         "So,",
-        "Look,",
-        "",  # Duplicate empty for higher probability
-        "",
-        ""
-    ]
+        "Look,"
+    )
+    # No starter is 4x as likely as any single starter
+    NATURAL_STARTER_WEIGHTS = (4, 1, 1, 1, 1, 1, 1, 1)
+    _STARTER_CUM_WEIGHTS = tuple(itertools.accumulate(NATURAL_STARTER_WEIGHTS))
     
     # Sentence connectors (casual, not AI-formal)
     CASUAL_CONNECTORS = {
@@ -82,6 +107,69 @@ class AdvancedHumanizer:
         "just"
     ]
     
+    # Natural contractions (formal -> casual)
+    CONTRACTIONS = {
+        "do not": "don't",
+        "does not": "doesn't",
+        "did not": "didn't",
+        "cannot": "can't",
+        "will not": "won't",
+        "would not": "wouldn't",
+        "could not": "couldn't",
+        "should not": "shouldn't",
+        "have not": "haven't",
+        "has not": "hasn't",
+        "had not": "hadn't",
+        "is not": "isn't",
+        "are not": "aren't",
+        "was not": "wasn't",
+        "were not": "weren't",
+        "I am": "I'm",
+        "you are": "you're",
+        "he is": "he's",
+        "she is": "she's",
+        "it is": "it's",
+        "we are": "we're",
+        "they are": "they're",
+        "I have": "I've",
+        "you have": "you've",
+        "we have": "we've",
+        "they have": "they've",
+        "I will": "I'll",
+        "you will": "you'll",
+        "he will": "he'll",
+        "she will": "she'll",
+        "we will": "we'll",
+        "they will": "they'll",
+        "that is": "that's",
+        "there is": "there's",
+        "what is": "what's",
+        "who is": "who's",
+        "where is": "where's",
+        "when is": "when's",
+        "why is": "why's",
+        "how is": "how's"
+    }
+    
+    # All formal openers as one anchored, repeated alternation: a single
+    # match() at offset 0 strips every stacked opener ("Moreover, Indeed, ...")
+    _FORMAL_PREFIX_RE = re.compile(
+        r'(?:(?:' + '|'.join(re.escape(f) for f in FORMAL_TRANSITIONS) + r')\s*)+'
+    )
+    
+    # Contractions + casual connectors fused into one alternation so the
+    # comment is scanned once (longest keys first to avoid partial matches)
+    _REPL_MAP: Dict[str, Union[str, List[str]]] = {
+        **{formal.lower(): casual for formal, casual in CONTRACTIONS.items()},
+        **CASUAL_CONNECTORS
+    }
+    _WORD_RE = re.compile(r'\S+')
+    _MEGA_PATTERN = _replacement_pattern(_REPL_MAP)
+    
+    def __init__(self, seed: Optional[int] = None):
+        # Per-instance generator: no shared global RNG state, seedable for tests
+        self._rng = random.Random(seed)
+    
     def humanize_comment(self, comment: str, user_style: Dict) -> str:
         """
         Apply comprehensive humanization
@@ -96,11 +184,15 @@ class AdvancedHumanizer:
         # Step 1: Clean AI artifacts
         comment = self._remove_ai_formality(comment)
         
-        # Step 2: Apply contractions (universal humanization)
-        comment = self._apply_contractions(comment)
+        # Step 2: Apply contractions + casual connectors (single pass)
+        comment = self._apply_casual_replacements(comment)
         
-        # Step 3: Add sentence variety (burstiness)
-        comment = self._vary_sentence_structure(comment)
+        # Step 3: Add sentence variety (burstiness). The comment is only
+        # rejoined when a sentence actually changed, keeping its whitespace
+        sentences = _split_sentences(comment)
+        varied = self._vary_sentence_structure(list(sentences))
+        if varied != sentences:
+            comment = ' '.join(varied)
         
         # Step 4: Add natural markers
         comment = self._add_conversational_markers(comment, user_style)
@@ -108,99 +200,67 @@ class AdvancedHumanizer:
         # Step 5: Strategic imperfections
         comment = self._add_natural_imperfections(comment, user_style)
         
-        # Step 6: Match user length preference
+        # Step 6: Match user length preference (last, so nothing added
+        # above can push the comment past it)
         comment = self._adjust_to_user_length(comment, user_style)
         
         return comment.strip()
     
+    def humanize_batch(self, comments: List[str], user_style: Dict) -> List[str]:
+        """
+        Humanize many comments for the same user in one call
+        
+        All substitution patterns are compiled once at class load, so the
+        whole batch shares them instead of paying any per-comment setup.
+        """
+        return [self.humanize_comment(comment, user_style) for comment in comments]
+    
     def _remove_ai_formality(self, text: str) -> str:
         """Remove formal AI transitions"""
-        for formal in self.FORMAL_TRANSITIONS:
-            if text.startswith(formal):
-                text = text[len(formal):].strip()
-        
-        # Replace formal connectors with casual ones
-        for formal, casual_list in self.CASUAL_CONNECTORS.items():
-            pattern = r'\b' + formal + r'\b'
-            if re.search(pattern, text, re.IGNORECASE):
-                casual = random.choice(casual_list)
-                text = re.sub(pattern, casual, text, flags=re.IGNORECASE, count=1)
-        
-        return text
+        match = self._FORMAL_PREFIX_RE.match(text)
+        return text[match.end():] if match else text
     
-    def _apply_contractions(self, text: str) -> str:
+    def _apply_casual_replacements(self, text: str) -> str:
         """
-        Apply natural contractions
+        Apply natural contractions and swap formal connectors for casual ones
         Research shows: humans use contractions 70%+ of time in casual writing
         """
-        contractions = {
-            r'\bdo not\b': "don't",
-            r'\bdoes not\b': "doesn't",
-            r'\bdid not\b': "didn't",
-            r'\bcannot\b': "can't",
-            r'\bwill not\b': "won't",
-            r'\bwould not\b': "wouldn't",
-            r'\bcould not\b': "couldn't",
-            r'\bshould not\b': "shouldn't",
-            r'\bhave not\b': "haven't",
-            r'\bhas not\b': "hasn't",
-            r'\bhad not\b': "hadn't",
-            r'\bis not\b': "isn't",
-            r'\bare not\b': "aren't",
-            r'\bwas not\b': "wasn't",
-            r'\bwere not\b': "weren't",
-            r'\bI am\b': "I'm",
-            r'\byou are\b': "you're",
-            r'\bhe is\b': "he's",
-            r'\bshe is\b': "she's",
-            r'\bit is\b': "it's",
-            r'\bwe are\b': "we're",
-            r'\bthey are\b': "they're",
-            r'\bI have\b': "I've",
-            r'\byou have\b': "you've",
-            r'\bwe have\b': "we've",
-            r'\bthey have\b': "they've",
-            r'\bI will\b': "I'll",
-            r'\byou will\b': "you'll",
-            r'\bhe will\b': "he'll",
-            r'\bshe will\b': "she'll",
-            r'\bwe will\b': "we'll",
-            r'\bthey will\b': "they'll",
-            r'\bthat is\b': "that's",
-            r'\bthere is\b': "there's",
-            r'\bwhat is\b': "what's",
-            r'\bwho is\b': "who's",
-            r'\bwhere is\b': "where's",
-            r'\bwhen is\b': "when's",
-            r'\bwhy is\b': "why's",
-            r'\bhow is\b': "how's"
-        }
+        replaced = set()
         
-        for pattern, contraction in contractions.items():
-            text = re.sub(pattern, contraction, text, flags=re.IGNORECASE)
+        def _choose_repl(match):
+            key = match.group(1).lower()
+            repl = self._REPL_MAP[key]
+            if isinstance(repl, str):
+                return repl
+            # Connectors: only the first occurrence of each is swapped
+            if key in replaced:
+                return match.group(0)
+            replaced.add(key)
+            return self._rng.choice(repl)
         
-        return text
+        return self._MEGA_PATTERN.sub(_choose_repl, text)
     
-    def _vary_sentence_structure(self, text: str) -> str:
+    def _vary_sentence_structure(self, sentences: List[str]) -> List[str]:
         """
         Increase burstiness - vary sentence lengths
         Research: Human writing has high variance in sentence length
         """
-        sentences = re.split(r'([.!?]+)', text)
-        sentences = [''.join(sentences[i:i+2]) for i in range(0, len(sentences)-1, 2)]
-        
         if len(sentences) > 1:
+            # One RNG draw for the whole pass: byte 0 is the combine roll,
+            # byte i+1 the split roll for sentence i (each roll in 0-255)
+            rolls = self._rng.getrandbits(8 * (len(sentences) + 1))
+            
             # Randomly combine or split sentences for variety
-            if random.random() < 0.3 and len(sentences) >= 2:
+            if (rolls & 0xFF) < 77 and len(sentences) >= 2:
                 # Combine two sentences occasionally
-                idx = random.randint(0, len(sentences)-2)
+                idx = self._rng.randint(0, len(sentences)-2)
                 combined = sentences[idx].rstrip('.!?') + '. ' + sentences[idx+1]
                 sentences = sentences[:idx] + [combined] + sentences[idx+2:]
             
             # Occasionally break a long sentence
             for i, sent in enumerate(sentences):
                 words = sent.split()
-                if len(words) > 15 and random.random() < 0.25:
+                if len(words) > 15 and (rolls >> 8 * (i + 1) & 0xFF) < 64:
                     # Split at a logical point
                     if ' but ' in sent.lower():
                         parts = sent.split(' but ', 1)
@@ -211,36 +271,39 @@ class AdvancedHumanizer:
                             sentences.append('But ' + parts[1].lstrip())
                         break
         
-        return ' '.join(sentences)
+        return sentences
     
     def _add_conversational_markers(self, text: str, user_style: Dict) -> str:
         """
         Add natural conversation markers
         Research: Casual LinkedIn comments use these 40%+ of time
         """
+        if not text:
+            return text
+        
         # 30% chance to add a natural starter
-        if random.random() < 0.3:
+        if self._rng.random() < 0.3:
             # Check user's typical openings
             user_openings = user_style.get('typical_comment_openings', [])
-            if user_openings and random.random() < 0.6:
+            if user_openings and self._rng.random() < 0.6:
                 # 60% chance to use user's actual opening
-                starter = random.choice(user_openings).capitalize()
+                starter = self._rng.choice(user_openings).capitalize()
                 if not text.startswith(starter):
                     text = f"{starter} {text[0].lower()}{text[1:]}"
             else:
                 # Use natural starters
-                starter = random.choice(self.NATURAL_STARTERS)
+                starter = self._rng.choices(self.NATURAL_STARTERS, cum_weights=self._STARTER_CUM_WEIGHTS)[0]
                 if starter:
                     text = f"{starter} {text[0].lower()}{text[1:]}"
         
         # 20% chance to add a casual filler (mid-sentence)
-        if random.random() < 0.2 and len(text.split()) > 8:
-            filler = random.choice(self.NATURAL_FILLERS)
-            words = text.split()
-            # Insert after 3-5 words
-            insert_pos = random.randint(3, min(5, len(words)-1))
-            words.insert(insert_pos, filler)
-            text = ' '.join(words)
+        if self._rng.random() < 0.2:
+            word_starts = [match.start() for match in self._WORD_RE.finditer(text)]
+            if len(word_starts) > 8:
+                filler = self._rng.choice(self.NATURAL_FILLERS)
+                # Insert after 3-5 words, leaving the rest of the text as is
+                pos = word_starts[self._rng.randint(3, min(5, len(word_starts)-1))]
+                text = f"{text[:pos]}{filler} {text[pos:]}"
         
         return text
     
@@ -249,28 +312,31 @@ class AdvancedHumanizer:
         Add strategic imperfections (humans aren't perfect)
         Research: Real LinkedIn comments have natural quirks
         """
+        # One RNG draw for all four decisions: each byte is a roll in 0-255
+        rolls = self._rng.getrandbits(32)
+        
         # 40% chance: Remove period at end (casual style)
-        if random.random() < 0.4 and text.endswith('.'):
+        if (rolls & 0xFF) < 102 and text.endswith('.'):
             text = text[:-1]
         
         # 30% chance: Use double space occasionally
-        if random.random() < 0.3:
-            text = re.sub(r'\.  ', '. ', text)  # Fix any existing
+        if (rolls >> 8 & 0xFF) < 77:
+            text = text.replace('.  ', '. ')  # Fix any existing
             sentences = text.split('. ')
             if len(sentences) > 1:
                 # Add double space once
-                join_with_double = random.randint(0, len(sentences)-2)
+                join_with_double = self._rng.randint(0, len(sentences)-2)
                 result = '. '.join(sentences[:join_with_double+1])
                 result += '.  ' + '. '.join(sentences[join_with_double+1:])
                 text = result
         
         # 25% chance: Start with lowercase (very casual)
-        if random.random() < 0.25 and user_style.get('tone') == 'casual':
-            if text[0].isupper() and not text.split()[0].isupper():  # Not acronym
+        if (rolls >> 16 & 0xFF) < 64 and user_style.get('tone') == 'casual':
+            if text and text[0].isupper() and not text.split(None, 1)[0].isupper():  # Not acronym
                 text = text[0].lower() + text[1:]
         
         # 15% chance: Add ellipsis for trailing thought
-        if random.random() < 0.15 and not text.endswith('?'):
+        if (rolls >> 24) < 38 and not text.endswith('?'):
             if text.endswith('.'):
                 text = text[:-1] + '...'
             else:
@@ -296,13 +362,10 @@ class AdvancedHumanizer:
         
         elif current_length > max_length:
             # Too long - trim
-            sentences = re.split(r'([.!?]+)', text)
-            sentences = [''.join(sentences[i:i+2]) for i in range(0, len(sentences)-1, 2)]
-            
             # Keep first sentence(s) until we hit max
             result = []
             word_count = 0
-            for sent in sentences:
+            for sent in _split_sentences(text):
                 sent_words = len(sent.split())
                 if word_count + sent_words <= max_length:
                     result.append(sent)
@@ -320,23 +383,27 @@ class AdvancedHumanizer:
         Calculate burstiness score (for testing)
         Higher = more human-like
         """
-        sentences = re.split(r'[.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+        sentences = _split_sentences(text)
         
         if len(sentences) < 2:
             return 0.0
         
         lengths = [len(s.split()) for s in sentences]
-        avg_length = sum(lengths) / len(lengths)
+        n = len(lengths)
+        avg_length = sum(lengths) / n
         
-        # Calculate variance
-        variance = sum((l - avg_length) ** 2 for l in lengths) / len(lengths)
+        # Variance from sum of squares (single pass, no per-item float math)
+        variance = max(sum(l * l for l in lengths) / n - avg_length ** 2, 0.0)
         std_dev = variance ** 0.5
         
         # Burstiness = std_dev / mean
         burstiness = std_dev / avg_length if avg_length > 0 else 0
         
         return burstiness
+    
+    def calculate_burstiness_scores(self, texts: List[str]) -> List[float]:
+        """Calculate burstiness scores for a batch of candidate comments"""
+        return [self.calculate_burstiness_score(text) for text in texts]
 
 
 def apply_advanced_humanization(comment: str, user_style: Dict) -> str:
@@ -350,5 +417,22 @@ def apply_advanced_humanization(comment: str, user_style: Dict) -> str:
     Returns:
         Humanized comment with natural patterns
     """
-    humanizer = AdvancedHumanizer()
-    return humanizer.humanize_comment(comment, user_style)
\ No newline at end of file
+    return _humanizer.humanize_comment(comment, user_style)
+
+
+def apply_advanced_humanization_batch(comments: List[str], user_style: Dict) -> List[str]:
+    """
+    Humanize a batch of comments sharing the same user style
+    
+    Args:
+        comments: Raw AI-generated comments
+        user_style: User's writing style preferences
+    
+    Returns:
+        Humanized comments, in the same order
+    """
+    return _humanizer.humanize_batch(comments, user_style)
+
+
+# Shared instance (the humanizer keeps no per-comment state)
+_humanizer = AdvancedHumanizer()
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Comment Cache
+Content-addressed store for generated comment sets: an in-memory TTL cache
+backed by one JSON file per key, so identical requests survive restarts
+"""
+from cachetools import TTLCache
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.core import json_codec
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CommentCache:
+    """
+    sha256-keyed cache of pipeline results
+    
+    Keys include a namespace (model + prompt version), so a prompt or model
+    change starts a fresh keyspace instead of serving stale comments.
+    Callers only store non-empty results.
+    """
+    
+    # Bump when the stored entry layout changes
+    SCHEMA_VERSION = 1
+    
+    def __init__(
+        self,
+        directory: Optional[str],
+        ttl_seconds: float,
+        namespace: str = "",
+        maxsize: int = 1024
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.namespace = hashlib.sha256(f"{self.SCHEMA_VERSION}:{namespace}".encode()).hexdigest()[:16]
+        self.directory = Path(directory).expanduser() if directory else None
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+        
+        if self.directory is not None:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"⚠️ Comment cache dir unavailable ({e}), using memory only")
+                self.directory = None
+    
+    def key(self, **parts) -> str:
+        """Stable digest of everything that shapes the cached value"""
+        payload = json_codec.dumps({"ns": self.namespace, **parts}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Entry for key from memory, else from disk (None if missing or expired)"""
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None or self.directory is None:
+            return entry
+        
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            entry = json_codec.loads(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Unreadable comment cache entry {key[:12]}: {e}")
+            return None
+        
+        with self._lock:
+            # Another request may have loaded it meanwhile: keep that object
+            return self._memory.setdefault(key, entry)
+    
+    def put(self, key: str, entry: Dict) -> None:
+        """Store entry in memory and write it through to disk atomically"""
+        with self._lock:
+            self._memory[key] = entry
+        if self.directory is None:
+            return
+        
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+                    tmp.write(json_codec.dumps(entry, default=str))
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"⚠️ Could not persist comment cache entry: {e}")
+    
+    def next_variant(self, key: str, variants: int) -> Optional[List[Dict]]:
+        """
+        Next stored result set for key, rotating through them, once `variants`
+        sets are stored (sampled generations stay varied on repeat requests)
+        """
+        entry = self.get(key)
+        if not entry or len(entry["results"]) < variants:
+            return None
+        
+        with self._lock:
+            index = entry["next"]
+            entry["next"] = (index + 1) % len(entry["results"])
+        return [dict(item) for item in entry["results"][index]]
+    
+    def add_variant(self, key: str, results: List[Dict], variants: int) -> None:
+        """Remember a freshly generated result set, up to `variants` per key"""
+        entry = self.get(key)
+        if entry is None:
+            self.put(key, {"results": [results], "next": 0})
+        elif len(entry["results"]) < variants:
+            entry["results"].append(results)
+            self.put(key, entry)
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
@@ -2,25 +2,45 @@
 Comment Generator Service
 Generates human-like LinkedIn comments using Claude
 """
-from anthropic import Anthropic
-from typing import Dict, List
+from typing import Dict, Iterable, List
 from app.core.config import settings
-import json
+from app.core.anthropic_client import get_async_client
+from app.core import json_codec
 import re
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Optional: linear-time multi-pattern matcher for the cliché bank
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+def _build_cliche_automaton(cliches: Iterable[str]):
+    """Aho-Corasick automaton over lowercased clichés (None if unavailable)"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    automaton = ahocorasick.Automaton()
+    for cliche in cliches:
+        automaton.add_word(cliche.lower(), len(cliche))
+    automaton.make_automaton()
+    return automaton
+
 
 class CommentGenerator:
     """Generates authentic LinkedIn comments"""
     
+    __slots__ = ("client", "model", "humanizer")
+    
     def __init__(self):
-        self.client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self.client = get_async_client()  # shared connection pool
         self.model = settings.CLAUDE_MODEL
         self.humanizer = HumanizationEngine()
     
-    def generate_comments(
+    async def generate_comments(
         self,
         user_style: Dict,
         target_profile: Dict,
@@ -49,7 +69,7 @@ class CommentGenerator:
                 post_content
             )
             
-            response = self.client.messages.create(
+            response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=settings.MAX_TOKENS,
                 temperature=settings.TEMPERATURE,
@@ -57,7 +77,7 @@ class CommentGenerator:
             )
             
             # Parse response
-            comments_data = json.loads(response.content[0].text)
+            comments_data = json_codec.loads(response.content[0].text)
             
             # Humanize each comment
             humanized_comments = []
@@ -187,6 +207,9 @@ Generate comments that this person would ACTUALLY write. Be authentic."""
 class HumanizationEngine:
     """Makes comments sound more human and less AI-generated"""
     
+    # Stateless: everything lives on the class
+    __slots__ = ()
+    
     # AI detection patterns to remove/replace
     AI_CLICHES = [
         "delve into", "navigate", "landscape", "realm", "tapestry",
@@ -195,36 +218,86 @@ class HumanizationEngine:
         "game-changer", "cutting-edge", "state-of-the-art"
     ]
     
-    def humanize(self, comment: str, user_style: Dict) -> str:
+    # Lowercased forms for O(1) membership checks on single tokens/phrases
+    AI_CLICHES_SET = frozenset(c.lower() for c in AI_CLICHES)
+    
+    # Compiled once at class load: one scan removes every cliché
+    _CLICHE_RE = re.compile(
+        '|'.join(re.escape(c) for c in sorted(AI_CLICHES, key=len, reverse=True)),
+        re.IGNORECASE
+    )
+    _WS_RE = re.compile(r'\s+')
+    
+    # Preferred when pyahocorasick is installed: single pass over the text,
+    # cost independent of how large the cliché bank grows
+    _CLICHE_AUTOMATON = _build_cliche_automaton(AI_CLICHES_SET)
+    
+    # Contractions allowed for casual users, applied in a single scan
+    _CONTRACTION_MAP = {
+        "cannot": "can't",
+        "do not": "don't",
+        "would not": "wouldn't",
+        "will not": "won't",
+        "should not": "shouldn't",
+        "could not": "couldn't",
+        "is not": "isn't",
+        "are not": "aren't"
+    }
+    _CONTRACTION_RE = re.compile(r'\b(' + '|'.join(_CONTRACTION_MAP) + r')\b')
+    
+    @classmethod
+    def humanize(cls, comment: str, user_style: Dict) -> str:
         """Apply humanization techniques"""
         
         # Remove AI clichés
-        comment = self._remove_ai_patterns(comment)
+        comment = cls._remove_ai_patterns(comment)
         
         # Add user-specific patterns
-        comment = self._apply_user_quirks(comment, user_style)
+        comment = cls._apply_user_quirks(comment, user_style)
         
         # Add natural imperfections if user has them
-        comment = self._add_natural_elements(comment, user_style)
+        comment = cls._add_natural_elements(comment, user_style)
         
         # Validate length
-        comment = self._adjust_length(comment, user_style)
+        comment = cls._adjust_length(comment, user_style)
         
         return comment.strip()
     
-    def _remove_ai_patterns(self, text: str) -> str:
+    @classmethod
+    def is_cliche(cls, phrase: str) -> bool:
+        """Whether a token or phrase is exactly one of the AI clichés"""
+        return phrase.lower() in cls.AI_CLICHES_SET
+    
+    @classmethod
+    def _remove_ai_patterns(cls, text: str) -> str:
         """Remove common AI writing patterns"""
-        for cliche in self.AI_CLICHES:
-            # Case-insensitive replacement
-            pattern = re.compile(re.escape(cliche), re.IGNORECASE)
-            text = pattern.sub("", text)
+        lowered = text.lower()
+        if cls._CLICHE_AUTOMATON is not None and len(lowered) == len(text):
+            text = cls._cut_cliche_spans(text, lowered)
+        else:
+            # Case-insensitive removal in one regex scan
+            text = cls._CLICHE_RE.sub('', text)
         
         # Clean up any double spaces
-        text = re.sub(r'\s+', ' ', text)
-        
-        return text
+        return cls._WS_RE.sub(' ', text)
+    
+    @classmethod
+    def _cut_cliche_spans(cls, text: str, lowered: str) -> str:
+        """Drop every automaton match, copying the untouched ranges once"""
+        # Matches arrive ordered by end offset; sort by start so nested and
+        # overlapping matches merge into a single cut
+        spans = sorted((end - length + 1, end + 1) for end, length in cls._CLICHE_AUTOMATON.iter(lowered))
+        pieces = []
+        keep_from = 0
+        for start, stop in spans:
+            if start > keep_from:
+                pieces.append(text[keep_from:start])
+            keep_from = max(keep_from, stop)
+        pieces.append(text[keep_from:])
+        return ''.join(pieces)
     
-    def _apply_user_quirks(self, comment: str, user_style: Dict) -> str:
+    @staticmethod
+    def _apply_user_quirks(comment: str, user_style: Dict) -> str:
         """Add user-specific writing patterns"""
         
         # Add emojis if user uses them
@@ -242,20 +315,20 @@ class HumanizationEngine:
         
         return comment
     
-    def _add_natural_elements(self, comment: str, user_style: Dict) -> str:
+    @classmethod
+    def _add_natural_elements(cls, comment: str, user_style: Dict) -> str:
         """Add human-like imperfections"""
         
         formality = user_style.get('formality_score', 0.6)
         
         # If casual, allow contractions
         if formality < 0.5:
-            comment = comment.replace('cannot', "can't")
-            comment = comment.replace('do not', "don't")
-            comment = comment.replace('would not', "wouldn't")
+            comment = cls._CONTRACTION_RE.sub(lambda m: cls._CONTRACTION_MAP[m.group(1)], comment)
         
         return comment
     
-    def _adjust_length(self, comment: str, user_style: Dict) -> str:
+    @staticmethod
+    def _adjust_length(comment: str, user_style: Dict) -> str:
         """Adjust comment length to match user's typical length"""
         
         words = comment.split()
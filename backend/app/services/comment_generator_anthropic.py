@@ -2,18 +2,79 @@
 ULTIMATE Comment Generator with FULL Humanization Pipeline
 - Dynamic prompts (20 sentiments + 50 angles)
 - Complete voice profile (82+ fields)
-- Paraphrase service
+- Haiku rewrite pass (only for low-quality drafts)
 - Advanced humanizer
 - Quality validation
 """
-from anthropic import Anthropic
-from typing import Dict, List
+from cachetools import LRUCache
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional, Sequence, Tuple
 from app.core.config import settings
-import json
+from app.core.anthropic_client import get_async_client
+from app.core import json_codec
+from app.services.comment_cache import CommentCache
+from app.services.semantic_cache import get_semantic_cache
+import asyncio
+import hashlib
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# Generation runs at temperature >= 0.7, so each cache key keeps up to
+# RESPONSE_CACHE_VARIANTS distinct result sets and hits rotate through them.
+RESPONSE_CACHE_VARIANTS = 3
+
+# (complete profile, voice prompt) per user_style hash: successive requests
+# from the same user skip rebuilding both
+_profile_cache = LRUCache(maxsize=128)
+
+
+def _style_key(user_style: Dict) -> str:
+    """
+    Stable hash of a user_style (orjson when installed)
+    Computed once per request and shared by every cache that keys on the
+    user, so the nested profile is serialized a single time
+    """
+    payload = json_codec.dumps(user_style, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+# Labels the model sometimes puts before the comment ("Comment: ...", "Here's ...")
+_COMMENT_PREFIX_RE = re.compile(r"^(?:\s*(?:comment:|response:|output:|here's|here is))+\s*", re.IGNORECASE)
+_WORD_RE = re.compile(r"\S+")
+
+
+@dataclass(frozen=True)
+class Tokenized:
+    """Cleaned comment text with its words, split exactly once"""
+    text: str
+    words: Tuple[str, ...]
+    
+    def __bool__(self) -> bool:
+        return bool(self.text)
+
+
+_EMPTY_DRAFT = Tokenized("", ())
+
+
+# Punctuation a user's profile can rule out: (char, punctuation_profile key, label)
+_FORBIDDABLE_PUNCTUATION = (
+    ("?", "question_marks", "question mark"),
+    ("!", "exclamation_marks", "exclamation mark"),
+)
+
+
+@dataclass(frozen=True)
+class ValidationRules:
+    """Per-user validation thresholds, resolved once from user_style"""
+    min_words: int
+    max_words: int
+    strict_min: int
+    strict_max: int
+    forbidden_punctuation: FrozenSet[str]
+    max_comma_density: float
+
 # Import all components
 try:
     from app.services.dynamic_prompt_engine import dynamic_prompt_engine
@@ -23,17 +84,8 @@ except:
     DYNAMIC_PROMPTS = False
     logger.warning("⚠️ Dynamic prompts not available")
 
-try:
-    from app.services.paraphrase_service import paraphrase_service
-    PARAPHRASE_AVAILABLE = True
-    logger.info("✓ Paraphrase service loaded")
-except:
-    PARAPHRASE_AVAILABLE = False
-    logger.warning("⚠️ Paraphrase service not available")
-
 try:
     from app.services.advanced_humanizer import AdvancedHumanizer
-    humanizer = AdvancedHumanizer()
     HUMANIZER_AVAILABLE = True
     logger.info("✓ Advanced humanizer loaded")
 except:
@@ -41,6 +93,12 @@ except:
     logger.warning("⚠️ Advanced humanizer not available")
 
 
+@lru_cache(maxsize=1)
+def _get_humanizer() -> "AdvancedHumanizer":
+    """Humanizer instance, created on first use"""
+    return AdvancedHumanizer()
+
+
 class CommentGenerator:
     """
     ULTIMATE comment generator with complete humanization pipeline:
@@ -50,21 +108,72 @@ class CommentGenerator:
     2. Select best angle (50+ options)
     3. Build dynamic prompt with complete voice profile
     4. Generate with Claude
-    5. Paraphrase (optional extra naturalness)
+    5. Paraphrase with Haiku (only when the draft scores poorly)
     6. Advanced humanize (rhythm, burstiness, natural markers)
     7. Validate quality
     8. Return 3 perfect variations
     """
     
+    # Caps in-flight Claude calls across all requests (rate-limit friendly);
+    # 429s are retried with exponential backoff by the shared client.
+    # Created by the first instance, so importing doesn't read settings
+    _api_semaphore: Optional[asyncio.Semaphore] = None
+    
+    # Drafts scoring below this (or carrying warnings) get a Haiku rewrite;
+    # the rest skip the extra call
+    PARAPHRASE_QUALITY_THRESHOLD = 75
+    
+    # cache_control blocks need this header on SDK/API versions predating
+    # prompt-caching GA; later versions ignore it
+    PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+    
+    PARAPHRASE_SYSTEM_PROMPT = (
+        "Rewrite this LinkedIn comment preserving meaning and voice. "
+        "Output ONLY the rewritten comment."
+    )
+    
     def __init__(self):
-        self.client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        if CommentGenerator._api_semaphore is None:
+            CommentGenerator._api_semaphore = asyncio.Semaphore(settings.ANTHROPIC_MAX_CONCURRENCY)
+        self._client = None  # resolved on first API call
         self.model = "claude-sonnet-4-20250514"
+        self.fast_model = "claude-3-5-haiku-20241022"  # Rewrite pass only
+        
+        # Finished result sets per (user, target, post) so previews/retries
+        # skip the whole pipeline; persisted across restarts, and keyed by
+        # model + system prompt so either changing invalidates old entries
+        prompt_version = dynamic_prompt_engine.SYSTEM_PROMPT if DYNAMIC_PROMPTS else "basic"
+        self.response_cache = CommentCache(
+            settings.COMMENT_CACHE_DIR,
+            ttl_seconds=settings.COMMENT_CACHE_HOURS * 3600,
+            namespace=f"{self.model}:{prompt_version}"
+        )
+        
+        # Optional: reuse comments generated for near-duplicate posts
+        self.semantic_cache = get_semantic_cache()
+        
+        # Pipeline stages are fixed for the process lifetime (the optional
+        # modules either imported or not), so pick them once here instead of
+        # re-checking the module flags for every variation
+        self._generate_draft = self._generate_with_dynamic_prompt if DYNAMIC_PROMPTS else self._generate_basic_draft
+        self._humanize = self._humanize_in_thread if HUMANIZER_AVAILABLE else self._skip_humanize
+        # The humanizer already enforces length/punctuation, so optionally
+        # trust its output instead of re-running every check on it
+        self._fast_validation = HUMANIZER_AVAILABLE and settings.TRUST_HUMANIZER
+        
         logger.info("✓ ULTIMATE CommentGenerator initialized")
         logger.info(f"   Dynamic Prompts: {DYNAMIC_PROMPTS}")
-        logger.info(f"   Paraphrase: {PARAPHRASE_AVAILABLE}")
+        logger.info(f"   Paraphrase: {self.fast_model} (quality < {self.PARAPHRASE_QUALITY_THRESHOLD})")
         logger.info(f"   Humanizer: {HUMANIZER_AVAILABLE}")
     
-    def generate_comments(
+    @property
+    def client(self):
+        """Shared pooled AsyncAnthropic client, built on first use"""
+        if self._client is None:
+            self._client = get_async_client()
+        return self._client
+    
+    async def generate_comments(
         self,
         post_content: str,
         user_style: Dict,
@@ -76,130 +185,541 @@ class CommentGenerator:
         Generate comments through COMPLETE humanization pipeline
         """
         
+        style_key = _style_key(user_style)
+        cache_key = self._response_cache_key(style_key, target_profile, post_context, post_content, num_variations)
+        cached = self._get_cached_response(cache_key)
+        if cached is not None:
+            logger.info("⚡ Response cache hit: %d comments", len(cached))
+            return cached
+        
+        vector, similar = await self._semantic_lookup(post_content, style_key)
+        if similar:
+            for number, comment in enumerate(similar, 1):
+                comment["variation_number"] = number
+            return similar
+        
         try:
-            logger.info("=" * 70)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("=" * 70)
             logger.info("🎯 ULTIMATE COMMENT GENERATION PIPELINE STARTING...")
-            logger.info("=" * 70)
             
             # Build complete user profile for dynamic prompts
-            user_profile = self._build_complete_profile(user_style, target_profile)
+            user_profile, voice_prompt = self._prepare_profile(user_style, target_profile, style_key)
             
-            all_comments = []
+            # The post section and validation rules are identical for every
+            # variation: build them once
+            post_prompt = self._build_post_prompt(post_content, post_context)
+            rules = self._validation_rules(user_style)
             
-            for variation in range(num_variations):
-                logger.info(f"   Generating variation {variation + 1}/{num_variations}...")
-                
-                # STEP 1: Generate with dynamic prompt
-                comment = self._generate_with_dynamic_prompt(
-                    post_content=post_content,
-                    user_profile=user_profile,
-                    post_context=post_context,
-                    variation=variation
+            if settings.SINGLE_CALL_VARIATIONS and DYNAMIC_PROMPTS:
+                # One round-trip drafts every variation; post-processing
+                # still runs per draft, concurrently
+                logger.info("   Generating %d variations in one call...", num_variations)
+                drafts = await self._generate_variations_single_call(
+                    post_content, user_profile, post_context, num_variations, post_prompt, voice_prompt
                 )
-                
-                if not comment:
-                    logger.warning(f"   Variation {variation + 1} failed generation")
-                    continue
-                
-                logger.info(f"   ✓ Generated: {len(comment)} chars")
-                
-                # STEP 2: Paraphrase (optional extra naturalness)
-                if PARAPHRASE_AVAILABLE and settings.PARAPHRASE_API_KEY:
-                    paraphrased = self._safe_paraphrase(comment)
-                    if paraphrased and paraphrased != comment:
-                        logger.info(f"   ✓ Paraphrased")
-                        comment = paraphrased
-                
-                # STEP 3: Advanced humanize (CRITICAL!)
-                if HUMANIZER_AVAILABLE:
-                    try:
-                        humanized = humanizer.humanize_comment(comment, user_style)
-                        if humanized:
-                            logger.info(f"   ✓ Humanized: {len(humanized)} chars")
-                            comment = humanized
-                        else:
-                            logger.info(f"   ⚠️ Humanization returned empty, using original")
-                    except Exception as e:
-                        logger.warning(f"   ⚠️ Humanization error: {e}, using original")
-                
-                # STEP 4: Validate
-                validation = self._validate_comment(comment, user_style)
-                
-                # Add to results
-                all_comments.append({
-                    'text': comment,
-                    'confidence': 0.88 + (variation * 0.02),
-                    'approach': post_context.get('best_response_type', 'context-aware'),
-                    'sentiment': post_context.get('post_type', 'general'),
-                    'variation_number': variation + 1,
-                    'validation': validation,
-                    'humanized': HUMANIZER_AVAILABLE,
-                    'paraphrased': PARAPHRASE_AVAILABLE and settings.PARAPHRASE_API_KEY
-                })
-                
-                logger.info(f"   ✓ Variation {variation + 1} complete (quality: {validation.get('quality_score', 85)})")
+                results = await asyncio.gather(*(
+                    self._finish_variation(draft, user_style, post_context, variation, rules)
+                    for variation, draft in enumerate(drafts)
+                ), return_exceptions=True)
+            else:
+                # Variations are independent: run them (and any rewrite calls
+                # they trigger) concurrently instead of back to back
+                logger.info("   Generating %d variations concurrently...", num_variations)
+                results = await asyncio.gather(*(
+                    self._run_variation(
+                        post_content=post_content,
+                        user_style=user_style,
+                        user_profile=user_profile,
+                        post_context=post_context,
+                        variation=variation,
+                        post_prompt=post_prompt,
+                        voice_prompt=voice_prompt,
+                        rules=rules
+                    )
+                    for variation in range(num_variations)
+                ), return_exceptions=True)
+            
+            # One failed variation shouldn't discard the ones that finished
+            all_comments = []
+            for variation, result in enumerate(results):
+                if isinstance(result, BaseException):
+                    logger.error("   Variation %d failed: %r", variation + 1, result)
+                elif result:
+                    all_comments.append(result)
             
-            logger.info("=" * 70)
-            logger.info(f"✅ PIPELINE COMPLETE: {len(all_comments)} comments generated")
-            logger.info(f"   All humanization layers applied: ✓")
-            logger.info("=" * 70)
+            logger.info("✅ PIPELINE COMPLETE: %d comments generated", len(all_comments))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("   All humanization layers applied: ✓")
+                logger.debug("=" * 70)
+            
+            if all_comments:
+                self._store_cached_response(cache_key, all_comments)
+                if vector is not None:
+                    self.semantic_cache.add(vector, style_key, all_comments)
             
             return all_comments
             
-        except Exception as e:
-            logger.error(f"PIPELINE ERROR: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return self._fallback_generation(post_content, user_style, num_variations)
+        except Exception:
+            logger.exception("PIPELINE ERROR")
+            return await self._fallback_generation(post_content, user_style, num_variations)
+    
+    async def generate_comments_stream(
+        self,
+        post_content: str,
+        user_style: Dict,
+        target_profile: Dict,
+        post_context: Dict,
+        num_variations: int = 3
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield each comment as soon as its variation finishes the pipeline
+        
+        Variations run concurrently, so the first comment arrives after one
+        generation round-trip instead of after all of them.
+        """
+        
+        style_key = _style_key(user_style)
+        cache_key = self._response_cache_key(style_key, target_profile, post_context, post_content, num_variations)
+        cached = self._get_cached_response(cache_key)
+        if cached is not None:
+            logger.info("⚡ Response cache hit: %d comments", len(cached))
+            for comment in cached:
+                yield comment
+            return
+        
+        logger.info("🎯 Streaming %d variations...", num_variations)
+        user_profile, voice_prompt = self._prepare_profile(user_style, target_profile, style_key)
+        post_prompt = self._build_post_prompt(post_content, post_context)
+        rules = self._validation_rules(user_style)
+        
+        tasks = [
+            asyncio.create_task(self._run_variation(
+                post_content=post_content,
+                user_style=user_style,
+                user_profile=user_profile,
+                post_context=post_context,
+                variation=variation,
+                post_prompt=post_prompt,
+                voice_prompt=voice_prompt,
+                rules=rules
+            ))
+            for variation in range(num_variations)
+        ]
+        
+        all_comments = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    result = await next_done
+                except Exception as e:
+                    logger.error("Variation error: %s", e)
+                    continue
+                if result:
+                    all_comments.append(result)
+                    yield result
+        finally:
+            # Client went away mid-stream: stop paying for the remaining calls
+            for task in tasks:
+                task.cancel()
+        
+        if all_comments:
+            all_comments.sort(key=lambda c: c['variation_number'])
+            self._store_cached_response(cache_key, all_comments)
+        else:
+            for comment in await self._fallback_generation(post_content, user_style, num_variations):
+                yield comment
     
-    def _generate_with_dynamic_prompt(
+    async def generate_comments_batch(
+        self,
+        jobs: List[Dict],
+        num_variations: int = 3,
+        poll_interval: Optional[float] = None
+    ) -> List[List[Dict]]:
+        """
+        Generate comments for many non-interactive jobs via the Message Batches API
+        
+        Each job is a dict with post_content, user_style, target_profile and
+        post_context. Every variation of every job goes into one batch (half
+        the price of live calls, results within 24h); the results then go
+        through the usual paraphrase -> humanize -> validate steps.
+        
+        Returns one comment list per job, in job order.
+        """
+        
+        if poll_interval is None:
+            poll_interval = settings.BATCH_POLL_INTERVAL
+        
+        if not DYNAMIC_PROMPTS:
+            # No prompt engine to build batch params: run the live pipeline
+            return list(await asyncio.gather(*(
+                self.generate_comments(num_variations=num_variations, **job) for job in jobs
+            )))
+        
+        profiles = [self._prepare_profile(job["user_style"], job["target_profile"]) for job in jobs]
+        post_prompts = [self._build_post_prompt(job["post_content"], job["post_context"]) for job in jobs]
+        requests = [
+            {
+                "custom_id": f"job-{job_index}-var-{variation}",
+                "params": self._build_generation_params(
+                    job["post_content"], profiles[job_index][0], job["post_context"], variation,
+                    post_prompt=post_prompts[job_index],
+                    voice_prompt=profiles[job_index][1]
+                )
+            }
+            for job_index, job in enumerate(jobs)
+            for variation in range(num_variations)
+        ]
+        
+        # Batches went GA after the pinned SDK release; fall back to the beta namespace
+        batches = getattr(self.client.messages, "batches", None) or self.client.beta.messages.batches
+        
+        batch = await batches.create(requests=requests)
+        logger.info(f"📦 Submitted message batch {batch.id}: {len(requests)} requests for {len(jobs)} jobs")
+        
+        while batch.processing_status != "ended":
+            await asyncio.sleep(poll_interval)
+            batch = await batches.retrieve(batch.id)
+        
+        drafts = {}
+        async for entry in await batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                drafts[entry.custom_id] = self._clean_comment_tokenized(entry.result.message.content[0].text)
+            else:
+                logger.warning(f"   Batch request {entry.custom_id} {entry.result.type}")
+        
+        results = []
+        for job_index, job in enumerate(jobs):
+            comments = []
+            rules = self._validation_rules(job["user_style"])
+            for variation in range(num_variations):
+                draft = drafts.get(f"job-{job_index}-var-{variation}")
+                if draft:
+                    comments.append(await self._finish_variation(
+                        draft, job["user_style"], job["post_context"], variation, rules
+                    ))
+            results.append(comments)
+        
+        logger.info(f"✅ Batch {batch.id} complete: {sum(len(c) for c in results)} comments")
+        return results
+    
+    async def _run_variation(
         self,
         post_content: str,
+        user_style: Dict,
         user_profile: Dict,
         post_context: Dict,
-        variation: int
+        variation: int,
+        post_prompt: Optional[str] = None,
+        voice_prompt: Optional[str] = None,
+        rules: Optional[ValidationRules] = None
+    ) -> Optional[Dict]:
+        """Run one variation through generate -> paraphrase -> humanize -> validate"""
+        
+        # STEP 1: Generate (dynamic prompt, or basic when unavailable)
+        comment = await self._generate_draft(
+            post_content=post_content,
+            user_profile=user_profile,
+            post_context=post_context,
+            variation=variation,
+            post_prompt=post_prompt,
+            voice_prompt=voice_prompt,
+            stop_after_words=rules.max_words if rules else None
+        )
+        
+        if not comment:
+            logger.warning(f"   Variation {variation + 1} failed generation")
+            return None
+        
+        logger.debug("   ✓ Generated: %d chars", len(comment.text))
+        
+        return await self._finish_variation(comment, user_style, post_context, variation, rules)
+    
+    async def _finish_variation(
+        self,
+        draft: Tokenized,
+        user_style: Dict,
+        post_context: Dict,
+        variation: int,
+        rules: Optional[ValidationRules] = None
+    ) -> Dict:
+        """Post-process a generated draft: paraphrase -> humanize -> validate"""
+        
+        if rules is None:
+            rules = self._validation_rules(user_style)
+        
+        # STEP 2: Paraphrase, only when the raw draft misses the user's profile
+        paraphrased = False
+        comment = draft.text
+        draft_check = self._validate_comment(comment, rules, draft.words)
+        if draft_check["quality_score"] < self.PARAPHRASE_QUALITY_THRESHOLD or draft_check["warnings"]:
+            rewritten = await self._safe_paraphrase(comment, draft_check["issues"] + draft_check["warnings"])
+            if rewritten and rewritten != comment:
+                logger.debug("   ✓ Paraphrased")
+                comment = rewritten
+                paraphrased = True
+        
+        # STEP 3: Advanced humanize (CRITICAL!)
+        comment = await self._humanize(comment, user_style)
+        
+        # STEP 4: Validate (reuse the draft check if nothing changed the text)
+        if comment == draft.text:
+            validation = draft_check
+        elif self._fast_validation:
+            validation = self._fast_validate(comment, rules)
+        else:
+            validation = self._validate_comment(comment, rules)
+        
+        logger.info("   ✓ Variation %d complete (quality: %s)", variation + 1, validation.get('quality_score', 85))
+        
+        return {
+            'text': comment,
+            'confidence': 0.88 + (variation * 0.02),
+            'approach': post_context.get('best_response_type', 'context-aware'),
+            'sentiment': post_context.get('post_type', 'general'),
+            'variation_number': variation + 1,
+            'validation': validation,
+            'humanized': HUMANIZER_AVAILABLE,
+            'paraphrased': paraphrased
+        }
+    
+    async def _humanize_in_thread(self, comment: str, user_style: Dict) -> str:
+        """Humanize in a worker thread (CPU-bound) so other variations' API calls stay in flight"""
+        try:
+            humanized = await asyncio.to_thread(_get_humanizer().humanize_comment, comment, user_style)
+        except Exception as e:
+            logger.warning(f"   ⚠️ Humanization error: {e}, using original")
+            return comment
+        if not humanized:
+            logger.info("   ⚠️ Humanization returned empty, using original")
+            return comment
+        logger.debug("   ✓ Humanized: %d chars", len(humanized))
+        return humanized
+    
+    async def _skip_humanize(self, comment: str, user_style: Dict) -> str:
+        """Humanizer stage when the humanizer module is not installed"""
+        return comment
+    
+    def _response_cache_key(
+        self,
+        style_key: str,
+        target_profile: Dict,
+        post_context: Dict,
+        post_content: str,
+        num_variations: int
     ) -> str:
-        """Generate using dynamic prompt system"""
+        """Content address of everything that shapes the generated comments"""
+        return self.response_cache.key(
+            u=style_key, t=target_profile, p=post_context, c=post_content, n=num_variations
+        )
+    
+    async def _semantic_lookup(self, post_content: str, style_key: str) -> Tuple:
+        """(post vector, cached comments or None); both None when disabled"""
+        if self.semantic_cache is None:
+            return None, None
+        try:
+            vector = await asyncio.to_thread(self.semantic_cache.embed, post_content)
+        except Exception as e:
+            logger.warning(f"⚠️ Semantic cache embedding failed: {e}")
+            return None, None
+        return vector, self.semantic_cache.lookup(vector, style_key)
+    
+    def _get_cached_response(self, cache_key: str) -> Optional[List[Dict]]:
+        """Next cached result set for this key, once enough variants are stored"""
+        return self.response_cache.next_variant(cache_key, RESPONSE_CACHE_VARIANTS)
+    
+    def _store_cached_response(self, cache_key: str, comments: List[Dict]) -> None:
+        """Remember a freshly generated result set for this key"""
+        self.response_cache.add_variant(cache_key, comments, RESPONSE_CACHE_VARIANTS)
+    
+    async def _create_message(self, **kwargs):
+        """Send one Messages API request, bounded by the shared semaphore"""
+        async with self._api_semaphore:
+            return await self.client.messages.create(**kwargs)
+    
+    async def _stream_message_text(self, stop_after_words: Optional[int] = None, **kwargs) -> str:
+        """
+        Stream one Messages API response and return its text
+        
+        Once the reply passes stop_after_words, stops reading and returns it
+        up to the last sentence end within the limit, instead of paying for
+        tokens validation would reject.
+        """
+        parts: List[str] = []
+        length = 0
+        word_count = 0
+        boundary = 0  # text length at the last sentence end within the limit
+        in_word = False
+        async with self._api_semaphore:
+            async with self.client.messages.stream(**kwargs) as stream:
+                async for chunk in stream.text_stream:
+                    parts.append(chunk)
+                    if stop_after_words:
+                        for token in _WORD_RE.finditer(chunk):
+                            # A token glued to the previous chunk continues its word
+                            if token.start() or not in_word:
+                                word_count += 1
+                            if token.group(0).endswith(('.', '!', '?')) and (
+                                    word_count <= stop_after_words or not boundary):
+                                boundary = length + token.end()
+                        if chunk:
+                            in_word = not chunk[-1].isspace()
+                    length += len(chunk)
+                    if stop_after_words and word_count > stop_after_words and boundary:
+                        logger.debug("   Early stop after %d chars", boundary)
+                        break
+                self._log_cache_usage(stream.current_message_snapshot)
+        text = "".join(parts)
+        return text[:boundary] if stop_after_words and word_count > stop_after_words and boundary else text
+    
+    def _build_generation_params(
+        self,
+        post_content: str,
+        user_profile: Dict,
+        post_context: Dict,
+        variation: int,
+        post_prompt: Optional[str] = None,
+        voice_prompt: Optional[str] = None
+    ) -> Dict:
+        """Messages API parameters for one dynamic-prompt variation"""
         
+        # Build ultimate dynamic prompt: the voice profile only depends on
+        # the user, the post section changes on every request
+        if voice_prompt is None:
+            voice_prompt = dynamic_prompt_engine.build_voice_profile_prompt(user_profile)
+        if post_prompt is None:
+            post_prompt = self._build_post_prompt(post_content, post_context)
+        
+        # Output budget sized to the user's length (~1.8 tokens/word plus
+        # slack) rather than a flat 500; uses the upper bound of the range
+        # so replies aren't cut mid-sentence
+        length = user_profile.get("rhythm_metrics", {}).get("sentence_length_mean_words", {})
+        budget_words = max(length.get("target", 50), length.get("max", 65))
+        
+        # Slight temperature variation per variation. Cache breakpoints sit
+        # after the system prompt and after the voice profile, so repeat
+        # calls for the same user reuse the whole static prefix.
+        return {
+            "model": self.model,
+            "max_tokens": int(budget_words * 1.8) + 32,
+            "temperature": 0.7 + (variation * 0.1),
+            "system": [{
+                "type": "text",
+                "text": dynamic_prompt_engine.SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }],
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": voice_prompt,
+                        "cache_control": {"type": "ephemeral"}
+                    },
+                    {
+                        "type": "text",
+                        "text": post_prompt
+                    }
+                ]
+            }]
+        }
+    
+    def _build_post_prompt(self, post_content: str, post_context: Dict) -> Optional[str]:
+        """Post-specific prompt section (None when dynamic prompts are unavailable)"""
         if not DYNAMIC_PROMPTS:
-            # Fallback to basic generation
-            return self._basic_generation(post_content, user_profile, post_context)
+            return None
+        return dynamic_prompt_engine.build_post_prompt(
+            post_content=post_content,
+            post_context=post_context
+        )
+    
+    async def _generate_with_dynamic_prompt(
+        self,
+        post_content: str,
+        user_profile: Dict,
+        post_context: Dict,
+        variation: int,
+        post_prompt: Optional[str] = None,
+        voice_prompt: Optional[str] = None,
+        stop_after_words: Optional[int] = None
+    ) -> Tokenized:
+        """Generate using dynamic prompt system"""
         
         try:
-            # Build ultimate dynamic prompt
-            prompt = dynamic_prompt_engine.build_ultimate_prompt(
-                post_content=post_content,
-                post_context=post_context,
-                user_profile=user_profile
-            )
-            
-            # Generate with slight temperature variation
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=500,
-                temperature=0.7 + (variation * 0.1),
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
+            text = await self._stream_message_text(
+                stop_after_words,
+                **self._build_generation_params(
+                    post_content, user_profile, post_context, variation, post_prompt, voice_prompt
+                ),
+                extra_headers=self.PROMPT_CACHING_HEADERS
             )
             
             # Extract comment
-            comment = response.content[0].text.strip()
-            comment = self._clean_comment(comment)
-            
-            return comment
+            return self._clean_comment_tokenized(text.strip())
             
         except Exception as e:
             logger.error(f"Dynamic generation error: {e}")
-            return self._basic_generation(post_content, user_profile, post_context)
+            return await self._basic_generation(post_content, user_profile, post_context)
     
-    def _basic_generation(
+    async def _generate_variations_single_call(
+        self,
+        post_content: str,
+        user_profile: Dict,
+        post_context: Dict,
+        num_variations: int,
+        post_prompt: Optional[str] = None,
+        voice_prompt: Optional[str] = None
+    ) -> List[Tokenized]:
+        """Ask for every variation in one response (JSON array, blank-line split fallback)"""
+        
+        params = self._build_generation_params(
+            post_content, user_profile, post_context, 0, post_prompt, voice_prompt
+        )
+        params["max_tokens"] *= num_variations
+        params["messages"][0]["content"].append({
+            "type": "text",
+            "text": f"Generate exactly {num_variations} distinct variations. "
+                    "Reply as a JSON array of strings, no prose."
+        })
+        
+        try:
+            response = await self._create_message(**params, extra_headers=self.PROMPT_CACHING_HEADERS)
+        except Exception as e:
+            logger.error(f"Single-call generation error: {e}")
+            return []
+        self._log_cache_usage(response)
+        text = response.content[0].text
+        
+        try:
+            items = json_codec.loads(text[text.index('['):text.rindex(']') + 1])
+            if not isinstance(items, list):
+                raise ValueError("expected a JSON array")
+        except ValueError:
+            logger.warning("   Variations were not a JSON array, splitting on blank lines")
+            items = text.split("\n\n")
+        
+        drafts = [self._clean_comment_tokenized(str(item)) for item in items]
+        return [draft for draft in drafts if draft][:num_variations]
+    
+    async def _generate_basic_draft(
+        self,
+        post_content: str,
+        user_profile: Dict,
+        post_context: Dict,
+        variation: int,
+        post_prompt: Optional[str] = None,
+        voice_prompt: Optional[str] = None,
+        stop_after_words: Optional[int] = None
+    ) -> Tokenized:
+        """Generation stage when dynamic prompts are unavailable (same signature as the dynamic one)"""
+        return await self._basic_generation(post_content, user_profile, post_context)
+    
+    async def _basic_generation(
         self,
         post_content: str,
         user_profile: Dict,
         post_context: Dict
-    ) -> str:
+    ) -> Tokenized:
         """Fallback basic generation"""
         
         tone = user_profile.get("core_voice_fingerprint", {}).get("tone", "professional")
@@ -216,26 +736,33 @@ Context: {post_context.get('post_type', 'general')}
 Make it authentic and specific. Output ONLY the comment."""
 
         try:
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=self.model,
                 max_tokens=300,
                 messages=[{"role": "user", "content": prompt}]
             )
             
-            return self._clean_comment(response.content[0].text)
+            return self._clean_comment_tokenized(response.content[0].text)
         except:
-            return ""
+            return _EMPTY_DRAFT
     
-    def _safe_paraphrase(self, comment: str) -> str:
-        """Safely attempt paraphrasing with fallback"""
+    async def _safe_paraphrase(self, comment: str, issues: List[str]) -> str:
+        """Safely attempt a Haiku rewrite with fallback"""
         try:
-            if not PARAPHRASE_AVAILABLE:
-                return comment
+            content = comment
+            if issues:
+                content += "\n\nFix these issues: " + "; ".join(issues)
             
-            paraphrased = paraphrase_service.paraphrase(comment, mode='fluency')
+            response = await self._create_message(
+                model=self.fast_model,
+                max_tokens=200,
+                system=self.PARAPHRASE_SYSTEM_PROMPT,
+                messages=[{"role": "user", "content": content}]
+            )
+            paraphrased = self._clean_comment(response.content[0].text)
             
             if paraphrased and len(paraphrased) > 10:
-                logger.info("   ✓ Paraphrased successfully")
+                logger.debug("   ✓ Paraphrased successfully")
                 return paraphrased
             else:
                 logger.info("   ⚠️ Paraphrase returned empty, using original")
@@ -245,21 +772,51 @@ Make it authentic and specific. Output ONLY the comment."""
             logger.warning(f"   ⚠️ Paraphrase failed: {e}, using original")
             return comment
     
-    def _validate_comment(self, comment: str, user_style: Dict) -> Dict:
-        """Validate comment quality"""
-        
-        word_count = len(comment.split())
+    def _log_cache_usage(self, response) -> None:
+        """Log prompt-cache reads vs writes for a Messages API response"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        logger.info(
+            "   Prompt cache: read=%s written=%s uncached_input=%s",
+            cache_read, cache_write, usage.input_tokens
+        )
+    
+    def _validation_rules(self, user_style: Dict) -> ValidationRules:
+        """Resolve the user's length/punctuation thresholds from user_style"""
         
         # Get target range
         rhythm = user_style.get("rhythm_metrics", {})
         sentence_length = rhythm.get("sentence_length_mean_words", {})
-        target = sentence_length.get("target", 50)
         min_words = sentence_length.get("min", 35)
         max_words = sentence_length.get("max", 65)
+        punctuation_profile = user_style.get("punctuation_profile", {})
         
-        # Strict validation range (wider tolerance)
-        strict_min = max(18, min_words - 15)
-        strict_max = min(88, max_words + 15)
+        return ValidationRules(
+            min_words=min_words,
+            max_words=max_words,
+            # Strict validation range (wider tolerance)
+            strict_min=max(18, min_words - 15),
+            strict_max=min(88, max_words + 15),
+            forbidden_punctuation=frozenset(
+                char for char, key, _ in _FORBIDDABLE_PUNCTUATION if punctuation_profile.get(key, 0) == 0
+            ),
+            max_comma_density=user_style.get("sentence_structure", {}).get("comma_density_per_100_words", {}).get("max", 2)
+        )
+    
+    def _validate_comment(
+        self,
+        comment: str,
+        rules: ValidationRules,
+        words: Optional[Sequence[str]] = None
+    ) -> Dict:
+        """Validate comment quality (pass words when the caller already split the text)"""
+        
+        word_count = len(words if words is not None else comment.split())
+        min_words, max_words = rules.min_words, rules.max_words
+        strict_min, strict_max = rules.strict_min, rules.strict_max
         
         issues = []
         warnings = []
@@ -273,20 +830,18 @@ Make it authentic and specific. Output ONLY the comment."""
             warnings.append(f"Length {word_count} words outside target range {min_words}-{max_words}")
             quality_score -= 10
         
-        # Check forbidden punctuation
-        punctuation_profile = user_style.get("punctuation_profile", {})
-        if punctuation_profile.get("question_marks", 0) == 0 and "?" in comment:
-            issues.append("Contains question mark (forbidden)")
-            quality_score -= 30
-        
-        if punctuation_profile.get("exclamation_marks", 0) == 0 and "!" in comment:
-            issues.append("Contains exclamation mark (forbidden)")
-            quality_score -= 30
+        # Check forbidden punctuation (one scan however many are forbidden)
+        if rules.forbidden_punctuation:
+            hits = rules.forbidden_punctuation.intersection(comment)
+            for char, _, label in _FORBIDDABLE_PUNCTUATION:
+                if char in hits:
+                    issues.append(f"Contains {label} (forbidden)")
+                    quality_score -= 30
         
         # Check comma density
         comma_count = comment.count(",")
         comma_density = (comma_count / word_count) * 100 if word_count > 0 else 0
-        max_comma_density = user_style.get("sentence_structure", {}).get("comma_density_per_100_words", {}).get("max", 2)
+        max_comma_density = rules.max_comma_density
         
         if comma_density > max_comma_density * 2:
             issues.append(f"Too many commas: {comma_count}")
@@ -308,8 +863,25 @@ Make it authentic and specific. Output ONLY the comment."""
             "strict_valid": word_count >= min_words and word_count <= max_words
         }
     
+    def _fast_validate(self, comment: str, rules: ValidationRules) -> Dict:
+        """Word-count-only validation for humanizer output (same shape as _validate_comment)"""
+        word_count = len(comment.split())
+        return {
+            "valid": True,
+            "issues": [],
+            "warnings": [],
+            "word_count": word_count,
+            "quality_score": 90,
+            "target_range": f"{rules.min_words}-{rules.max_words}",
+            "strict_valid": rules.min_words <= word_count <= rules.max_words
+        }
+    
     def _clean_comment(self, text: str) -> str:
         """Clean generated comment"""
+        return self._clean_comment_tokenized(text).text
+    
+    def _clean_comment_tokenized(self, text: str) -> Tokenized:
+        """Clean generated comment, keeping the words from the whitespace pass"""
         
         # Remove quotes
         text = text.strip('"').strip("'")
@@ -317,16 +889,34 @@ Make it authentic and specific. Output ONLY the comment."""
         # Remove markdown
         text = text.replace('**', '')
         
-        # Remove prefixes
-        prefixes = ['comment:', 'response:', 'output:', 'here\'s', 'here is']
-        for prefix in prefixes:
-            if text.lower().startswith(prefix):
-                text = text[len(prefix):].strip()
+        # Remove prefixes (one anchored scan, no lowercased copies)
+        text = _COMMENT_PREFIX_RE.sub('', text, count=1)
         
         # Remove excessive whitespace
-        text = ' '.join(text.split())
+        words = tuple(text.split())
+        
+        return Tokenized(' '.join(words), words)
+    
+    def _prepare_profile(
+        self,
+        user_style: Dict,
+        target_profile: Dict,
+        profile_key: Optional[str] = None
+    ) -> Tuple[Dict, Optional[str]]:
+        """Complete profile and rendered voice prompt, memoized per user_style"""
+        if profile_key is None:
+            profile_key = _style_key(user_style)
+        cached = _profile_cache.get(profile_key)
+        if cached is not None:
+            return cached
         
-        return text
+        user_profile = self._build_complete_profile(user_style, target_profile)
+        voice_prompt = (
+            dynamic_prompt_engine.build_voice_profile_prompt(user_profile, cache_key=profile_key)
+            if DYNAMIC_PROMPTS else None
+        )
+        _profile_cache[profile_key] = (user_profile, voice_prompt)
+        return user_profile, voice_prompt
     
     def _build_complete_profile(self, user_style: Dict, target_profile: Dict) -> Dict:
         """Build complete user profile for dynamic prompts"""
@@ -357,7 +947,7 @@ Make it authentic and specific. Output ONLY the comment."""
             }
         }
     
-    def _fallback_generation(
+    async def _fallback_generation(
         self,
         post_content: str,
         user_style: Dict,
@@ -383,7 +973,7 @@ Style: {tone}
 One per line, authentic and specific."""
 
         try:
-            response = self.client.messages.create(
+            response = await self._create_message(
                 model=self.model,
                 max_tokens=800,
                 messages=[{"role": "user", "content": simple_prompt}]
@@ -422,5 +1012,7 @@ One per line, authentic and specific."""
             return []
 
 
-# Global instance
-comment_generator = CommentGenerator()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_comment_generator() -> CommentGenerator:
+    """Process-wide generator, created on first call rather than at import"""
+    return CommentGenerator()
\ No newline at end of file
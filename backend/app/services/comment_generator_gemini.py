@@ -4,26 +4,174 @@ Generates human-like LinkedIn comments using Gemini (FREE)
 Enhanced with advanced humanization + paraphrasing
 """
 import google.generativeai as genai
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 from app.core.config import settings
-import json
+from app.core.gemini_client import generate_content, get_generative_model
+from app.core import json_codec
 import re
 import logging
 import random
-from app.services.advanced_humanizer import apply_advanced_humanization
+from app.services.advanced_humanizer import apply_advanced_humanization_batch
+from app.services.comment_cache import CommentCache
 from app.services.paraphrase_service import paraphrase_service
+from app.services.post_classifier import EmbeddingPostClassifier, classify_post
+from app.services.semantic_cache import get_semantic_cache
 
 logger = logging.getLogger(__name__)
 
+# Optional: linear-time multi-pattern matcher for the cliché bank
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+# Post text sent to Gemini: URLs and emoji carry no comment-worthy content,
+# and ~4 characters make one token
+POST_PROMPT_TOKENS = 100
+_CHARS_PER_TOKEN = 4
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+_EMOJI_RE = re.compile('[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]')
+_WS_RUN_RE = re.compile(r'\s+')
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+# Words the prompts ban; a cascade rung whose humanized comments still use
+# one of them is escalated to the next model
+BANNED_WORDS = (
+    "immense", "powerful", "invaluable", "truly", "inspiring", "journey", "pave the way",
+    "wisdom", "transparent", "reflection", "regarding", "highlighted", "critical",
+    "valuable insights", "delve", "leverage", "game-changing"
+)
+_BANNED_WORDS_LINE = ", ".join(f'"{word}"' for word in BANNED_WORDS)
+_BANNED_WORD_RE = re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in BANNED_WORDS) + r')\b', re.IGNORECASE)
+
+# Post-processing off the calling thread: humanizing streamed comments while
+# the response is still being read, and humanize + paraphrase per batched post
+_FINISH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gemini-finish")
+
+# Sampled output (temperature > 0.3) keeps several result sets per cache key
+# and rotates through them; near-deterministic output needs only one
+RESPONSE_CACHE_VARIANTS = 1 if settings.TEMPERATURE <= 0.3 else 3
+
+
+def _compact_post(text: str, max_tokens: int = POST_PROMPT_TOKENS) -> str:
+    """
+    Post text trimmed to about max_tokens without cutting mid-sentence:
+    URLs/emoji dropped and whitespace collapsed, then (if still too long) the
+    opening sentences plus the closing one, where posts put their point
+    """
+    budget = max_tokens * _CHARS_PER_TOKEN
+    text = _WS_RUN_RE.sub(' ', _EMOJI_RE.sub('', _URL_RE.sub('', text))).strip()
+    if len(text) <= budget:
+        return text
+    
+    sentences = _SENTENCE_END_RE.split(text)
+    kept = sentences[:2]
+    if len(sentences) > 2 and len(' '.join(kept + sentences[-1:])) <= budget:
+        kept.append("…")
+        kept.append(sentences[-1])
+    compact = ' '.join(kept)
+    if len(compact) > budget:
+        # A single very long sentence: cut at the last word boundary
+        compact = compact[:budget].rsplit(' ', 1)[0] + "…"
+    return compact
+
+
+def _build_cliche_automaton(cliches: Iterable[str]):
+    """Aho-Corasick automaton over lowercased clichés (None if unavailable)"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    automaton = ahocorasick.Automaton()
+    for cliche in cliches:
+        automaton.add_word(cliche.lower(), len(cliche))
+    automaton.make_automaton()
+    return automaton
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+def _static_prompt_prefix(examples: List[str]) -> str:
+    """Request-independent head of the generation prompt for one set of examples"""
+    return f"""Write 3 SHORT LinkedIn comments for the post at the end of this message.
+
+The post type, tone and approaches given with the post were pre-classified by
+keywords. First check them against the post: if they are wrong, use your own
+(type: achievement, question, story, opinion, news, tips, poll, announcement,
+lesson, general) and write the comments for the corrected ones.
+
+CRITICAL RULES (ANTI-HALLUCINATION):
+1. Keep it SHORT (20-50 words max)
+2. Reference SPECIFIC words/numbers from the post (not generic "your insights")
+3. Match the POST TONE
+4. Use the 3 REQUIRED APPROACHES, one per comment
+5. NO corporate jargon or AI phrases
+6. Sound like you're texting a smart friend
+7. Add personal touch ONLY if genuinely relevant
+8. Vary sentence lengths dramatically
+9. NEVER mention topics not in the post
+10. NEVER invent credentials or experiences
+
+SELF-CHECK BEFORE GENERATING:
+For each comment ask:
+- Did I reference something SPECIFIC from the post?
+- Did I add real value (not just praise)?
+- Does this sound like a real text message?
+- Did I stay 100% within what the post discusses?
+
+If ANY answer is NO, rewrite until all are YES.
+
+GOOD EXAMPLES for this type of post:
+{chr(10).join(f'- "{ex}"' for ex in examples)}
+
+BAD EXAMPLES (NEVER do this):
+- "Your journey from X to Y is inspiring..." [Generic, could apply anywhere]
+- "As someone in enterprise sales..." [Don't invent credentials]
+- "This reminds me of Steve Jobs..." [Don't add external references]
+- "Great insights!" [Too generic, doesn't reference specifics]
+- "This highlights the critical importance of..." [Corporate speak]
+
+BANNED WORDS: {_BANNED_WORDS_LINE}
+
+Write like a REAL person commenting on this SPECIFIC post. Short. Direct. Genuine. Grounded in the actual post content."""
+
 
 class CommentGenerator:
     """Generates authentic LinkedIn comments using Gemini 2.5 Flash"""
     
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        # Use Flash/Flash-Lite for fast, cheap comment generation
-        self.model = genai.GenerativeModel(settings.GEMINI_GENERATION_MODEL)
+        # Use Flash/Flash-Lite for fast, cheap comment generation (shared
+        # model: the SDK client is configured once per process)
+        self.model = get_generative_model(settings.GEMINI_GENERATION_MODEL)
+        # Cascade: the tiny model answers first, Flash only when it falls short
+        self.generation_models = [self.model]
+        if settings.GEMINI_TINY_MODEL and settings.GEMINI_TINY_MODEL != settings.GEMINI_GENERATION_MODEL:
+            self.generation_models.insert(0, get_generative_model(settings.GEMINI_TINY_MODEL))
         # Now using advanced_humanizer module with burstiness & natural patterns
+        
+        # Finished comment sets for identical requests (retries, previews)
+        self.response_cache = CommentCache(
+            settings.COMMENT_CACHE_DIR,
+            ttl_seconds=settings.COMMENT_CACHE_HOURS * 3600,
+            namespace=f"gemini:{settings.GEMINI_GENERATION_MODEL}:{settings.TEMPERATURE}"
+        )
+        
+        # Optional: reuse raw comments generated for near-duplicate posts.
+        # Entries are scoped per model, not per user: style is applied after
+        # lookup by the humanizer
+        self.semantic_cache = get_semantic_cache()
+        self.semantic_scope = f"gemini:{settings.GEMINI_GENERATION_MODEL}"
+        # Same vectors classify the post type (keyword classifier otherwise)
+        self.type_classifier = (
+            EmbeddingPostClassifier(self.semantic_cache.embed)
+            if self.semantic_cache is not None else None
+        )
     
     def generate_comments(
         self,
@@ -35,8 +183,8 @@ class CommentGenerator:
         """
         Generate 3 comment variations based on post type analysis
         
-        STEP 1: Analyze what TYPE of post this is
-        STEP 2: Generate 3 variations suited to that type
+        STEP 1: Classify the post TYPE locally (keywords, no LLM call)
+        STEP 2: One Gemini call confirms the type and writes 3 variations
         
         Returns:
             [
@@ -49,8 +197,22 @@ class CommentGenerator:
             ]
         """
         try:
-            # STEP 1: Analyze post type and determine appropriate approaches
-            post_analysis = self._analyze_post_type(post_content, post_context)
+            cache_key = self.response_cache.key(
+                u=user_style, t=target_profile, p=post_context, c=post_content
+            )
+            cached = self.response_cache.next_variant(cache_key, RESPONSE_CACHE_VARIANTS)
+            if cached is not None:
+                logger.info(f"⚡ Response cache hit: {len(cached)} comments")
+                return cached
+            
+            # Near-duplicate post seen before: skip Gemini, restyle its comments
+            vector, cached = self._semantic_lookup(post_content)
+            if cached:
+                return self._finish_comments(cached, user_style)
+            
+            # STEP 1: Preselect post type and approaches (the generation call
+            # may refine them, saving a separate analysis round-trip)
+            post_analysis = self._preselect_post_analysis(post_content, vector)
             
             logger.info(f"📊 Post Type: {post_analysis['type']} | Suggested approaches: {post_analysis['approaches']}")
             
@@ -63,57 +225,38 @@ class CommentGenerator:
                 post_analysis
             )
             
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,  # Balanced: natural but grounded
-                    max_output_tokens=settings.MAX_TOKENS,
-                    top_p=0.9,  # Reduces hallucination by limiting token choices
-                    top_k=40,   # Further limits wild token selections
-                )
-            )
-            
-            # Parse response
-            response_text = response.text
-            response_text = self._clean_json_response(response_text)
+            # Cheapest model first; escalate while its comments fail the check
+            last_rung = len(self.generation_models) - 1
+            for rung, model in enumerate(self.generation_models):
+                try:
+                    streamed, header, humanized_texts = self._stream_comments(model, prompt, user_style)
+                except Exception as e:
+                    if rung == last_rung:
+                        raise
+                    logger.warning(f"⚠️ {model.model_name} failed ({e}), escalating")
+                    continue
+                if rung == last_rung or self._passes_cascade_check(humanized_texts):
+                    break
+                logger.info(f"↗️ {model.model_name} output failed validation, escalating")
             
-            try:
-                comments_data = json.loads(response_text)
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON parse error: {e}")
+            if not streamed:
+                logger.error("No comment lines in Gemini response")
                 return self._fallback_comments(post_analysis['approaches'])
             
+            post_analysis = self._merge_post_analysis(post_analysis, header)
+            
+            raw_comments = self._raw_comments(streamed, post_analysis['approaches'])
+            if vector is not None and raw_comments:
+                self.semantic_cache.add(vector, self.semantic_scope, raw_comments)
+            
             # STEP 3: Apply advanced humanization + paraphrasing
-            humanized_comments = []
-            for i, comment in enumerate(comments_data.get("comments", []), 1):
-                # Step 3a: Advanced humanization (burstiness, natural patterns)
-                humanized_text = apply_advanced_humanization(
-                    comment.get("text", ""),
-                    user_style
-                )
-                
-                # Step 3b: Paraphrase for extra variation (if enabled)
-                if paraphrase_service.enabled:
-                    logger.debug(f"Paraphrasing comment {i}/3...")
-                    paraphrased_text = paraphrase_service.paraphrase(
-                        humanized_text,
-                        mode="standard"  # Options: standard, fluent, creative
-                    )
-                    final_text = paraphrased_text if paraphrased_text else humanized_text
-                else:
-                    final_text = humanized_text
-                
-                humanized_comments.append({
-                    "text": final_text,
-                    "variation": i,
-                    "confidence": comment.get("confidence", 0.8),
-                    "approach": comment.get("approach", post_analysis['approaches'][i-1] if i <= len(post_analysis['approaches']) else "engaging")
-                })
+            humanized_comments = self._finish_comments(raw_comments, user_style, humanized_texts)
             
             if not humanized_comments:
                 logger.warning("No comments generated, using fallback")
                 return self._fallback_comments(post_analysis['approaches'])
             
+            self.response_cache.add_variant(cache_key, humanized_comments, RESPONSE_CACHE_VARIANTS)
             logger.info(f"✓ Generated {len(humanized_comments)} comments for {post_analysis['type']} post")
             return humanized_comments
             
@@ -121,173 +264,272 @@ class CommentGenerator:
             logger.error(f"Error generating comments: {str(e)}")
             return self._fallback_comments()
     
-    def _analyze_post_type(self, post_content: str, post_context: Dict) -> Dict:
+    # Posts packed into one prompt by generate_comments_batch
+    BATCH_PROMPT_POSTS = 10
+    
+    def generate_comments_batch(self, jobs: List[Dict]) -> List[List[Dict]]:
         """
-        Analyze post to determine its type and best comment approaches
+        Generate comments for many posts, BATCH_PROMPT_POSTS per Gemini call
         
-        Returns:
-            {
-                "type": "achievement" | "question" | "story" | etc,
-                "approaches": [approach1, approach2, approach3],
-                "tone": "celebratory" | "thoughtful" | etc
-            }
+        Each job is a dict with post_content, user_style, target_profile and
+        post_context (as for the Anthropic batch path). The shared rules are
+        sent once per call instead of once per post; each post's comments
+        then go through the usual humanize -> paraphrase steps.
+        
+        Returns one comment list per job, in job order.
         """
+        results: List[Optional[List[Dict]]] = [None] * len(jobs)
+        pending = []
+        for index, job in enumerate(jobs):
+            cache_key = self.response_cache.key(
+                u=job["user_style"], t=job["target_profile"], p=job["post_context"], c=job["post_content"]
+            )
+            cached = self.response_cache.next_variant(cache_key, RESPONSE_CACHE_VARIANTS)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append((index, cache_key, self._fallback_post_analysis(job["post_content"])))
+        
+        for start in range(0, len(pending), self.BATCH_PROMPT_POSTS):
+            group = pending[start:start + self.BATCH_PROMPT_POSTS]
+            entries = self._generate_batch_group(jobs, group)
+            finished = _FINISH_POOL.map(
+                lambda item: self._finish_batch_job(jobs[item[0]], item[1], item[2], entries.get(str(item[0]))),
+                group
+            )
+            for (index, _, _), comments in zip(group, finished):
+                results[index] = comments
+        
+        logger.info(f"✅ Batch complete: {len(jobs)} posts, {len(pending)} generated")
+        return results
+    
+    def _generate_batch_group(self, jobs: List[Dict], group: List[Tuple]) -> Dict[str, Dict]:
+        """One Gemini call for a group of pending jobs: {post_id: result entry}"""
+        prompt = self._build_batch_generation_prompt(
+            [(str(index), jobs[index], analysis) for index, _, analysis in group]
+        )
         try:
-            # Simplified, clearer prompt
-            analysis_prompt = f"""Analyze this LinkedIn post. Return JSON only, no explanation.
-
-POST: {post_content[:400]}
-
-Determine:
-1. Post type: achievement, question, story, opinion, news, tips, poll, announcement, lesson, general
-2. Best 3 comment approaches
-3. Overall tone
-
-Return this exact format:
-{{"type":"achievement","approaches":["congratulate","ask_details","relate"],"tone":"celebratory"}}
-
-Examples by type:
-- achievement: {{"type":"achievement","approaches":["congratulate","ask_about_process","relate_win"],"tone":"celebratory"}}
-- question: {{"type":"question","approaches":["answer_directly","share_experience","ask_followup"],"tone":"helpful"}}
-- story: {{"type":"story","approaches":["empathize","share_similar","highlight_lesson"],"tone":"supportive"}}
-- tips: {{"type":"tips","approaches":["thank_add_tip","ask_clarification","share_result"],"tone":"engaging"}}
-- opinion: {{"type":"opinion","approaches":["agree_expand","polite_counter","add_nuance"],"tone":"thoughtful"}}
-
-Return ONLY the JSON object, nothing else."""
-
-            response = self.model.generate_content(
-                analysis_prompt,
+            response = generate_content(
+                self.model,
+                prompt,
                 generation_config=genai.types.GenerationConfig(
-                    temperature=0.2,  # Very low for consistent JSON
-                    max_output_tokens=300,  # Increased to prevent truncation
+                    temperature=settings.TEMPERATURE,
+                    max_output_tokens=max(settings.MAX_TOKENS, 400 * len(group)),
+                    top_p=0.9,
+                    top_k=40,
                 )
             )
-            
-            # Enhanced JSON cleaning
-            analysis_text = self._clean_json_response_strict(response.text)
-            
-            # Attempt to parse
-            analysis = json.loads(analysis_text)
-            
-            # Validate and extract
-            post_type = analysis.get("type", "general")
-            approaches = analysis.get("approaches", ["engage", "respond", "react"])
-            tone = analysis.get("tone", "thoughtful")
-            
-            # Ensure we have 3 approaches
-            if not isinstance(approaches, list) or len(approaches) < 3:
-                approaches = ["engage", "question", "relate"]
-            
-            logger.info(f"✓ Post analyzed: {post_type} | {', '.join(approaches[:3])}")
-            
-            return {
-                "type": post_type,
-                "approaches": approaches[:3],  # Only first 3
-                "tone": tone
-            }
-            
-        except json.JSONDecodeError as e:
-            logger.warning(f"JSON parse failed: {e}, using keyword detection")
-            return self._fallback_post_analysis(post_content)
+            data = json_codec.loads(self._clean_json_response(response.text))
         except Exception as e:
-            logger.warning(f"Post analysis error: {e}, using keyword detection")
-            return self._fallback_post_analysis(post_content)
-    
-    def _fallback_post_analysis(self, post_content: str) -> Dict:
-        """Fallback: Simple keyword-based post type detection"""
-        content_lower = post_content.lower()
+            logger.error(f"Batch generation error: {e}")
+            return {}
         
-        # Question detection
-        if '?' in content_lower or any(word in content_lower for word in ['what do you think', 'thoughts?', 'how do you', 'which', 'recommendations']):
-            return {
-                "type": "question",
-                "approaches": ["answer_directly", "share_experience", "ask_followup"],
-                "tone": "helpful"
-            }
-        
-        # Achievement detection
-        elif any(word in content_lower for word in ['excited to', 'proud to', 'happy to announce', 'achieved', 'launched', 'released', 'thrilled']):
-            return {
-                "type": "achievement",
-                "approaches": ["congratulate", "ask_details", "relate_experience"],
-                "tone": "celebratory"
-            }
+        return {
+            str(entry.get("post_id")): entry
+            for entry in data.get("results", [])
+            if isinstance(entry, dict)
+        }
+    
+    def _finish_batch_job(
+        self,
+        job: Dict,
+        cache_key: str,
+        post_analysis: Dict,
+        entry: Optional[Dict]
+    ) -> List[Dict]:
+        """Humanize one post's batched comments (fallback comments if it got none)"""
+        if not entry:
+            return self._fallback_comments(post_analysis['approaches'])
+        try:
+            post_analysis = self._merge_post_analysis(post_analysis, entry)
+            raw_comments = self._raw_comments(entry.get("comments", []), post_analysis['approaches'])
+            comments = self._finish_comments(raw_comments, job["user_style"])
+        except Exception as e:
+            logger.error(f"Error finishing batched comments: {e}")
+            return self._fallback_comments(post_analysis['approaches'])
         
-        # Lesson/Failure detection
-        elif any(word in content_lower for word in ['failed', 'mistake', 'learned', 'lesson', 'lost', 'tough']):
-            return {
-                "type": "lesson",
-                "approaches": ["empathize", "share_similar", "highlight_growth"],
-                "tone": "supportive"
+        if not comments:
+            return self._fallback_comments(post_analysis['approaches'])
+        self.response_cache.add_variant(cache_key, comments, RESPONSE_CACHE_VARIANTS)
+        return comments
+    
+    def _raw_comments(self, items: List, approaches: List[str]) -> List[Dict]:
+        """Normalize model comment objects to {text, confidence, approach}"""
+        return [
+            {
+                "text": comment.get("text", ""),
+                "confidence": comment.get("confidence", 0.8),
+                "approach": comment.get("approach", approaches[i] if i < len(approaches) else "engaging")
             }
+            for i, comment in enumerate(items)
+            if isinstance(comment, dict)
+        ]
+    
+    def _semantic_lookup(self, post_content: str) -> Tuple:
+        """(post vector, cached raw comments or None); both None when disabled"""
+        if self.semantic_cache is None:
+            return None, None
+        try:
+            # Only the compacted post reaches the prompt, so only it matters
+            vector = self.semantic_cache.embed(_compact_post(post_content))
+        except Exception as e:
+            logger.warning(f"⚠️ Semantic cache embedding failed: {e}")
+            return None, None
+        return vector, self.semantic_cache.lookup(vector, self.semantic_scope)
+    
+    def _finish_comments(
+        self,
+        raw_comments: List[Dict],
+        user_style: Dict,
+        humanized_texts: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """Humanize (+ paraphrase) raw {text, confidence, approach} comments for this user"""
+        
+        # Step 3a: Advanced humanization (burstiness, natural patterns),
+        # one batched call for every comment of this user (skipped when
+        # the comments were already humanized while streaming)
+        if humanized_texts is None:
+            humanized_texts = apply_advanced_humanization_batch(
+                [comment["text"] for comment in raw_comments],
+                user_style
+            )
         
-        # Tips/Advice detection
-        elif any(word in content_lower for word in ['tip', 'tips:', 'advice', 'how to', 'guide', 'steps', 'here\'s how']):
-            return {
-                "type": "tips",
-                "approaches": ["thank_add_tip", "ask_question", "share_result"],
-                "tone": "engaging"
-            }
+        # Step 3b: Paraphrase for extra variation (if enabled), all
+        # comments concurrently rather than one round-trip after another
+        if paraphrase_service.enabled:
+            paraphrased_texts = paraphrase_service.paraphrase_batch(
+                humanized_texts,
+                mode="standard"  # Options: standard, fluent, creative
+            )
+            final_texts = [
+                paraphrased or humanized
+                for paraphrased, humanized in zip(paraphrased_texts, humanized_texts)
+            ]
+        else:
+            final_texts = humanized_texts
         
-        # Opinion/Debate detection
-        elif any(word in content_lower for word in ['i think', 'in my opinion', 'unpopular', 'controversial', 'hot take']):
-            return {
-                "type": "opinion",
-                "approaches": ["agree_expand", "polite_counter", "add_perspective"],
-                "tone": "thoughtful"
+        return [
+            {
+                "text": final_text,
+                "variation": i,
+                "confidence": comment["confidence"],
+                "approach": comment["approach"]
             }
-        
-        # News/Update detection
-        elif any(word in content_lower for word in ['just released', 'breaking', 'announced', 'update:', 'news']):
+            for i, (comment, final_text) in enumerate(zip(raw_comments, final_texts), 1)
+        ]
+    
+    def _stream_comments(self, model, prompt: str, user_style: Dict) -> Tuple[List[Dict], Dict, List[str]]:
+        """One streamed generation: (comment dicts, TYPE header, humanized texts)"""
+        response = generate_content(
+            model,
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=settings.TEMPERATURE,  # 0.7 default: natural but grounded
+                max_output_tokens=settings.MAX_TOKENS,
+                top_p=0.9,  # Reduces hallucination by limiting token choices
+                top_k=40,   # Further limits wild token selections
+            ),
+            stream=True
+        )
+        
+        # The reply is one "||"-delimited line per field set. Hand each
+        # comment line to the pool as soon as it ends, so it is humanized
+        # while this thread keeps reading the stream
+        header = {}
+        streamed = []
+        pending_humanized = []
+        for line in self._iter_reply_lines(response):
+            parsed = self._parse_reply_line(line)
+            if parsed is None:
+                continue
+            if "approaches" in parsed:
+                header = parsed
+                continue
+            streamed.append(parsed)
+            pending_humanized.append(_FINISH_POOL.submit(
+                apply_advanced_humanization_batch, [parsed["text"]], user_style
+            ))
+        humanized_texts = [text for future in pending_humanized for text in future.result()]
+        return streamed, header, humanized_texts
+    
+    def _passes_cascade_check(self, humanized_texts: List[str]) -> bool:
+        """A cheap rung's output is kept only with 3+ comments and no banned word left"""
+        return (
+            len(humanized_texts) >= settings.COMMENT_VARIATIONS
+            and not any(_BANNED_WORD_RE.search(text) for text in humanized_texts)
+        )
+    
+    def _iter_reply_lines(self, response):
+        """Complete lines of a streamed response, each yielded as soon as it ends"""
+        pending = ""
+        for chunk in response:
+            pending += self._chunk_text(chunk)
+            *lines, pending = pending.split("\n")
+            yield from lines
+        yield pending
+    
+    def _parse_reply_line(self, line: str) -> Optional[Dict]:
+        """
+        Parse one reply line: "TYPE||type||tone||a1,a2,a3" gives the post
+        analysis, "approach||text" a comment; anything else is None
+        """
+        line = line.strip().strip('`')
+        if "||" not in line:
+            return None
+        head, rest = line.split("||", 1)
+        head = head.strip()
+        
+        if head.upper() == "TYPE":
+            fields = [field.strip() for field in rest.split("||")]
+            if len(fields) < 3:
+                return None
             return {
-                "type": "news",
-                "approaches": ["react_implications", "ask_question", "share_perspective"],
-                "tone": "informative"
+                "type": fields[0],
+                "tone": fields[1],
+                "approaches": [a.strip() for a in fields[2].split(",") if a.strip()]
             }
         
-        # Default: General engagement
-        else:
-            return {
-                "type": "general",
-                "approaches": ["engage", "question", "relate"],
-                "tone": "thoughtful"
-            }
+        text = rest.strip().strip('"')
+        if not text:
+            return None
+        comment = {"text": text}
+        if head:
+            comment["approach"] = head
+        return comment
     
-    def _clean_json_response_strict(self, text: str) -> str:
-        """Enhanced JSON cleaning for better parsing"""
-        import re
-        
-        # Remove markdown code blocks
-        if '```json' in text:
-            text = text.split('```json')[1].split('```')[0]
-        elif '```' in text:
-            text = text.split('```')[1].split('```')[0]
-        
-        # Strip whitespace
-        text = text.strip()
-        
-        # Find JSON object boundaries
-        start = text.find('{')
-        end = text.rfind('}')
-        
-        if start != -1 and end != -1 and end > start:
-            text = text[start:end+1]
-        else:
-            # No valid JSON found
-            raise json.JSONDecodeError("No JSON object found", text, 0)
-        
-        # Remove trailing commas before closing braces/brackets
-        text = re.sub(r',\s*}', '}', text)
-        text = re.sub(r',\s*]', ']', text)
-        
-        # Remove any newlines within strings (common issue)
-        text = text.replace('\n', ' ')
-        text = text.replace('\r', ' ')
-        
-        # Remove multiple spaces
-        text = re.sub(r'\s+', ' ', text)
-        
-        return text
+    def _chunk_text(self, chunk) -> str:
+        """Text of one streamed chunk ("" for chunks without text parts)"""
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+    
+    def _preselect_post_analysis(self, post_content: str, vector) -> Dict:
+        """Embedding classifier when a post vector is at hand, keywords otherwise"""
+        if vector is not None and self.type_classifier is not None:
+            try:
+                analysis = self.type_classifier.classify(vector)
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding post classifier failed: {e}")
+                analysis = None
+            if analysis is not None:
+                return analysis
+        return self._fallback_post_analysis(post_content)
+    
+    def _merge_post_analysis(self, preselected: Dict, response: Dict) -> Dict:
+        """Prefer the model's type/approaches/tone when present and well-formed"""
+        approaches = response.get("approaches")
+        if not isinstance(approaches, list) or len(approaches) < 3:
+            approaches = preselected["approaches"]
+        return {
+            "type": response.get("type") or preselected["type"],
+            "approaches": approaches[:3],
+            "tone": response.get("tone") or preselected["tone"]
+        }
+    
+    def _fallback_post_analysis(self, post_content: str) -> Dict:
+        """Simple keyword-based post type detection (no LLM call)"""
+        return classify_post(post_content)
     
     def _extract_key_facts(self, post_content: str) -> List[str]:
         """
@@ -314,6 +556,53 @@ Return ONLY the JSON object, nothing else."""
         
         return facts[:5]  # Max 5 facts total
     
+    # Good examples per post type (the generic set covers everything else)
+    TYPE_EXAMPLES = {
+        "achievement": [
+            "That's huge. What was the tipping point?",
+            "Congrats! How long did this take?",
+            "Love this. The grind paid off."
+        ],
+        "question": [
+            "Been using X for 2 years. Game changer.",
+            "Depends on your use case. What's your setup?",
+            "Have you tried Y? Worked better for me."
+        ],
+        "story": [
+            "That $50K wasn't lost, it was tuition.",
+            "Been there. The clarity after failure changes everything.",
+            "Timing is brutal. Great idea, wrong moment = expensive."
+        ],
+        "tips": [
+            "Number 3 is underrated. Saved me months.",
+            "Would add: always test before scaling.",
+            "This. Especially the part about X."
+        ],
+        "opinion": [
+            "Hard disagree on point 2, but respect the take.",
+            "Interesting. How do you handle X then?",
+            "This perspective makes sense for B2B, less for B2C."
+        ],
+        "news": [
+            "This changes everything for small teams.",
+            "About time. What took them so long?",
+            "Curious how this affects enterprise deals."
+        ]
+    }
+    DEFAULT_EXAMPLES = [
+        "That resonates. Been thinking about this too.",
+        "Great point. How'd you figure this out?",
+        "Makes sense. Timing is everything."
+    ]
+    
+    # Everything that does not depend on the request comes first and is
+    # byte-identical per post type, so Gemini's implicit prefix cache can
+    # reuse it; the post, facts and user style follow at the end
+    _STATIC_PREFIX_BY_TYPE = {
+        post_type: _static_prompt_prefix(examples) for post_type, examples in TYPE_EXAMPLES.items()
+    }
+    _STATIC_PREFIX_DEFAULT = _static_prompt_prefix(DEFAULT_EXAMPLES)
+    
     def _build_dynamic_generation_prompt(
         self,
         user_style: Dict,
@@ -329,7 +618,8 @@ Return ONLY the JSON object, nothing else."""
         tone = post_analysis['tone']
         
         # NEW: Use extracted facts from profile analyzer if available
-        key_facts = post_context.get('extracted_facts', [])
+        # (copied: the key points below must not accumulate in post_context)
+        key_facts = list(post_context.get('extracted_facts', []))
         
         # Fallback: Extract our own facts if analyzer didn't provide them
         if not key_facts:
@@ -340,46 +630,6 @@ Return ONLY the JSON object, nothing else."""
         if analyzer_key_points:
             key_facts.extend([f"key point: {point}" for point in analyzer_key_points[:3]])
         
-        # Dynamic examples based on post type
-        type_examples = {
-            "achievement": [
-                "That's huge. What was the tipping point?",
-                "Congrats! How long did this take?",
-                "Love this. The grind paid off."
-            ],
-            "question": [
-                "Been using X for 2 years. Game changer.",
-                "Depends on your use case. What's your setup?",
-                "Have you tried Y? Worked better for me."
-            ],
-            "story": [
-                "That $50K wasn't lost, it was tuition.",
-                "Been there. The clarity after failure changes everything.",
-                "Timing is brutal. Great idea, wrong moment = expensive."
-            ],
-            "tips": [
-                "Number 3 is underrated. Saved me months.",
-                "Would add: always test before scaling.",
-                "This. Especially the part about X."
-            ],
-            "opinion": [
-                "Hard disagree on point 2, but respect the take.",
-                "Interesting. How do you handle X then?",
-                "This perspective makes sense for B2B, less for B2C."
-            ],
-            "news": [
-                "This changes everything for small teams.",
-                "About time. What took them so long?",
-                "Curious how this affects enterprise deals."
-            ]
-        }
-        
-        examples = type_examples.get(post_type, [
-            "That resonates. Been thinking about this too.",
-            "Great point. How'd you figure this out?",
-            "Makes sense. Timing is everything."
-        ])
-        
         # Build facts section
         facts_instruction = ""
         if key_facts:
@@ -397,58 +647,63 @@ YOUR TYPICAL COMMENT STARTERS (optionally use these naturally):
 {', '.join(f'"{opener}"' for opener in user_openings[:3])}
 """
         
-        return f"""Write 3 SHORT LinkedIn comments for a {post_type.upper()} post.
+        static_prefix = self._STATIC_PREFIX_BY_TYPE.get(post_type, self._STATIC_PREFIX_DEFAULT)
+        
+        return f"""{static_prefix}
 
 POST TYPE: {post_type}
 POST TONE: {tone}
 REQUIRED APPROACHES: {', '.join(approaches)}
 
 POST CONTENT:
-{post_content[:400]}
+{_compact_post(post_content)}
 {facts_instruction}
 
 USER STYLE: {user_style.get('tone')}, {user_style.get('avg_comment_length', 35)} words avg{openings_hint}
 
-CRITICAL RULES (ANTI-HALLUCINATION):
-1. Keep it SHORT (20-50 words max)
-2. Reference SPECIFIC words/numbers from the post above (not generic "your insights")
-3. Match the {tone} tone of the post
-4. Use these 3 approaches: {', '.join(approaches)}
-5. NO corporate jargon or AI phrases
-6. Sound like you're texting a smart friend
-7. Add personal touch ONLY if genuinely relevant
-8. Vary sentence lengths dramatically
-9. NEVER mention topics not in the post
-10. NEVER invent credentials or experiences
-
-SELF-CHECK BEFORE GENERATING:
-For each comment ask:
-- Did I reference something SPECIFIC from the post?
-- Did I add real value (not just praise)?
-- Does this sound like a real text message?
-- Did I stay 100% within what the post discusses?
-
-If ANY answer is NO, rewrite until all are YES.
+Reply in EXACTLY 4 lines and nothing else (no JSON, no numbering, no quotes).
+Line 1 gives the (confirmed or corrected) type, tone and approaches; then one
+line per comment, each starting with its approach:
+TYPE||{post_type}||{tone}||{approaches[0]},{approaches[1]},{approaches[2]}
+{approaches[0]}||comment using {approaches[0]} approach - reference specific post content
+{approaches[1]}||comment using {approaches[1]} approach - reference specific post content
+{approaches[2]}||comment using {approaches[2]} approach - reference specific post content"""
+    
+    def _build_batch_generation_prompt(self, posts: List[Tuple[str, Dict, Dict]]) -> str:
+        """Prompt for several posts at once: shared rules once, then each (post_id, job, analysis)"""
+        
+        sections = []
+        for post_id, job, analysis in posts:
+            user_style = job["user_style"]
+            key_facts = job["post_context"].get('extracted_facts') or self._extract_key_facts(job["post_content"])
+            facts_line = f"\nFACTS (reference at least ONE): {'; '.join(key_facts[:5])}" if key_facts else ""
+            sections.append(f"""--- POST {post_id} ---
+TYPE: {analysis['type']} | TONE: {analysis['tone']} | APPROACHES: {', '.join(analysis['approaches'])}
+USER STYLE: {user_style.get('tone')}, {user_style.get('avg_comment_length', 35)} words avg{facts_line}
+{_compact_post(job["post_content"])}""")
+        
+        return f"""Write 3 SHORT LinkedIn comments for EACH post below.
 
-GOOD EXAMPLES for {post_type}:
-{chr(10).join(f'- "{ex}"' for ex in examples)}
+Each post's type, tone and approaches were pre-classified by keywords. If they
+are wrong for that post, correct them and write for the corrected ones.
 
-BAD EXAMPLES (NEVER do this):
-- "Your journey from X to Y is inspiring..." [Generic, could apply anywhere]
-- "As someone in enterprise sales..." [Don't invent credentials]
-- "This reminds me of Steve Jobs..." [Don't add external references]
-- "Great insights!" [Too generic, doesn't reference specifics]
-- "This highlights the critical importance of..." [Corporate speak]
+CRITICAL RULES (every comment):
+1. Keep it SHORT (20-50 words max)
+2. Reference SPECIFIC words/numbers from its post (not generic "your insights")
+3. Match the post's tone; use its 3 approaches, one per comment
+4. NO corporate jargon or AI phrases
+5. Sound like you're texting a smart friend
+6. NEVER mention topics not in the post
+7. NEVER invent credentials or experiences
 
-BANNED WORDS: "immense", "powerful", "invaluable", "truly", "inspiring", "journey", "pave the way", "wisdom", "transparent", "reflection", "regarding", "highlighted", "critical", "valuable insights", "delve", "leverage", "game-changing"
+BANNED WORDS: {_BANNED_WORDS_LINE}
 
-Write like a REAL person commenting on this SPECIFIC {post_type} post. Short. Direct. Genuine. Grounded in the actual post content.
+{chr(10).join(sections)}
 
-Return JSON with 3 comments:
-{{"comments":[
-  {{"text":"comment using {approaches[0]} approach - reference specific post content","approach":"{approaches[0]}"}},
-  {{"text":"comment using {approaches[1]} approach - reference specific post content","approach":"{approaches[1]}"}},
-  {{"text":"comment using {approaches[2]} approach - reference specific post content","approach":"{approaches[2]}"}}
+Return ONE JSON object with one entry per post, in order:
+{{"results":[
+  {{"post_id":"<id>","type":"<type>","tone":"<tone>","approaches":["a","b","c"],
+   "comments":[{{"text":"...","approach":"a"}},{{"text":"...","approach":"b"}},{{"text":"...","approach":"c"}}]}}
 ]}}"""
     
     def _build_generation_prompt(
@@ -462,7 +717,7 @@ Return JSON with 3 comments:
         
         return f"""Write 3 SHORT LinkedIn comments. Sound HUMAN, not AI.
 
-POST: {post_content[:400]}
+POST: {_compact_post(post_content)}
 
 USER STYLE: {user_style.get('tone')}, {user_style.get('avg_comment_length', 40)} words avg
 
@@ -540,7 +795,6 @@ Return JSON:
     
     def _clean_json_response(self, text: str) -> str:
         """Clean and repair JSON response from LLM"""
-        import re
         
         # Remove markdown code blocks
         if '```json' in text:
@@ -584,13 +838,46 @@ Return JSON:
                 for _ in range(open_braces):
                     text += '}'
         
-        # Remove trailing commas
-        text = re.sub(r',\s*}', '}', text)
-        text = re.sub(r',\s*]', ']', text)
+        # Remove trailing commas (before } and ] in one pass)
+        text = _TRAILING_COMMA_RE.sub(r'\1', text)
         
         return text
 
 
+@dataclass(frozen=True)
+class StyleProfile:
+    """Humanizer settings resolved once per distinct user style"""
+    emojis: Tuple[str, ...]
+    emoji_probability: float
+    starters: Tuple[str, ...]
+    starter_probability: float
+    max_words: int
+    trim_words: int
+
+
+_HUMANIZER_EMOJIS = ('💯', '🎯', '👏', '💪', '🔥')
+_HUMANIZER_STARTERS = ('Yep.', 'True.', 'Exactly.', 'Yeah,', 'Totally.')
+
+
+def _style_key(user_style: Dict) -> Tuple:
+    """The user_style fields the humanizer reads, as a hashable key"""
+    return (user_style.get('emoji_usage', 'none'),)
+
+
+@lru_cache(maxsize=1024)
+def _compile_style(style_key: Tuple) -> StyleProfile:
+    (emoji_usage,) = style_key
+    uses_emoji = emoji_usage in ('moderate', 'high')
+    return StyleProfile(
+        emojis=_HUMANIZER_EMOJIS if uses_emoji else (),
+        emoji_probability=0.2 if uses_emoji else 0.0,
+        starters=_HUMANIZER_STARTERS,
+        starter_probability=0.25,
+        max_words=50,
+        trim_words=45
+    )
+
+
 class HumanizationEngine:
     """Makes comments sound more human and less AI-generated"""
     
@@ -641,57 +928,72 @@ class HumanizationEngine:
         "critical choice": "huge decision",
         "valuable to others": "helpful",
         "struggle with": "deal with",
-        
-        # Shorten everything
-        "it is": "it's",
-        "you are": "you're",
-        "that is": "that's",
-        "there is": "there's",
-        "what is": "what's",
-        "cannot": "can't",
-        "should not": "shouldn't",
-        "would not": "wouldn't",
     }
     
+    # ALWAYS use contractions (sounds more human)
+    CONTRACTIONS = {
+        "it is": "it's", "you are": "you're", "that is": "that's",
+        "there is": "there's", "what is": "what's", "cannot": "can't",
+        "do not": "don't", "will not": "won't", "should not": "shouldn't",
+        "would not": "wouldn't", "could not": "couldn't"
+    }
+    
+    # Compiled once at class load instead of per cliché on every call
+    # (longest first so "delve into" wins over "delve")
+    _CLICHE_RE = re.compile(
+        r'\b(?:' + '|'.join(re.escape(c) for c in sorted(AI_CLICHES, key=len, reverse=True)) + r')\b',
+        re.IGNORECASE
+    )
+    # Natural replacements and contractions in one pass over the comment
+    REPLACEMENTS = {**NATURAL_REPLACEMENTS, **CONTRACTIONS}
+    _REPLACEMENT_RE = re.compile(
+        r'\b(' + '|'.join(re.escape(p) for p in sorted(REPLACEMENTS, key=len, reverse=True)) + r')\b',
+        re.IGNORECASE
+    )
+    _WS_RE = re.compile(r'\s+')
+    # A sentence and the punctuation run that ends it
+    _SENTENCE_PART_RE = re.compile(r'([^.!?]+)[.!?]*')
+    
+    # Preferred when pyahocorasick is installed: one pass over the text
+    # however many clichés the bank holds (_CLICHE_RE is the fallback)
+    _CLICHE_AUTOMATON = _build_cliche_automaton(AI_CLICHES)
+    
+    def __init__(self, seed: Optional[int] = None):
+        # Per-instance generator (as in AdvancedHumanizer): no shared global
+        # RNG state, seedable for tests
+        self._rng = random.Random(seed)
+    
     def humanize(self, comment: str, user_style: Dict) -> str:
         """Apply humanization techniques"""
         
+        # Style settings are compiled once per distinct style, not per comment
+        profile = _compile_style(_style_key(user_style))
+        
+        # Every random decision for this comment, drawn up front
+        emoji_roll, starter_roll = self._rng.random(), self._rng.random()
+        
         # Remove AI clichés
         comment = self._remove_ai_patterns(comment)
         
         # Ensure burstiness (critical for AI detection)
-        comment = self._ensure_burstiness(comment, user_style)
+        comment = self._ensure_burstiness(comment, profile)
         
         # Add user-specific patterns
-        comment = self._apply_user_quirks(comment, user_style)
+        comment = self._apply_user_quirks(comment, profile, emoji_roll)
         
         # Add natural imperfections if user has them
-        comment = self._add_natural_elements(comment, user_style)
+        comment = self._add_natural_elements(comment, profile, starter_roll)
         
         # Validate length
-        comment = self._adjust_length(comment, user_style)
+        comment = self._adjust_length(comment, profile)
         
         return comment.strip()
     
-    def _ensure_burstiness(self, comment: str, user_style: Dict) -> str:
+    def _ensure_burstiness(self, comment: str, profile: StyleProfile) -> str:
         """Ensure dramatic sentence length variation (critical for AI detection)"""
-        
-        sentences = re.split(r'[.!?]+', comment)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        if len(sentences) < 2:
-            return comment
-        
-        # Check if burstiness is needed
-        lengths = [len(s.split()) for s in sentences]
-        variation = max(lengths) - min(lengths) if lengths else 0
-        
-        # If variation is too low (monotonous), it's AI-like
-        if variation < 10 and len(sentences) >= 3:
-            # Try to add variation by splitting long sentences or combining short ones
-            # This is a safety net - the LLM should handle this
-            pass
-        
+        # Monotonous comments (3+ sentences within 10 words of each other)
+        # are left to the prompt: there is no rewrite step here yet, so the
+        # sentences are not split and measured just to be discarded
         return comment
     
     def _remove_ai_patterns(self, text: str) -> str:
@@ -699,17 +1001,17 @@ class HumanizationEngine:
         original = text
         
         # Remove AI clichés
-        for cliche in self.AI_CLICHES:
-            pattern = re.compile(r'\b' + re.escape(cliche) + r'\b', re.IGNORECASE)
-            text = pattern.sub("", text)
+        lowered = text.lower()
+        if self._CLICHE_AUTOMATON is not None and len(lowered) == len(text):
+            text = self._cut_cliche_spans(text, lowered)
+        else:
+            text = self._CLICHE_RE.sub("", text)
         
-        # Apply natural replacements
-        for ai_phrase, natural in self.NATURAL_REPLACEMENTS.items():
-            pattern = re.compile(r'\b' + re.escape(ai_phrase) + r'\b', re.IGNORECASE)
-            text = pattern.sub(natural, text)
+        # Apply natural replacements and (ALWAYS) contractions
+        text = self._REPLACEMENT_RE.sub(lambda m: self.REPLACEMENTS[m.group(1).lower()], text)
         
         # Clean up double spaces
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = self._WS_RE.sub(' ', text).strip()
         
         # If we killed the comment, return original
         if len(text) < 10:
@@ -717,78 +1019,75 @@ class HumanizationEngine:
         
         return text
     
-    def _apply_user_quirks(self, comment: str, user_style: Dict) -> str:
-        """Add user-specific patterns"""
-        
-        # ALWAYS use contractions (sounds more human)
-        contractions = {
-            "it is": "it's", "you are": "you're", "that is": "that's",
-            "there is": "there's", "what is": "what's", "cannot": "can't",
-            "do not": "don't", "will not": "won't", "should not": "shouldn't",
-            "would not": "wouldn't", "could not": "couldn't"
-        }
-        
-        for formal, casual in contractions.items():
-            comment = re.sub(r'\b' + formal + r'\b', casual, comment, flags=re.IGNORECASE)
+    def _cut_cliche_spans(self, text: str, lowered: str) -> str:
+        """Drop every whole-word automaton match, copying the untouched ranges once"""
+        size = len(lowered)
+        # Clichés start and end with word characters, so a whole-word match
+        # (the \b of _CLICHE_RE) has no word character on either side
+        spans = sorted(
+            (start, stop)
+            for start, stop in (
+                (end - length + 1, end + 1) for end, length in self._CLICHE_AUTOMATON.iter(lowered)
+            )
+            if (start == 0 or not _is_word_char(lowered[start - 1]))
+            and (stop == size or not _is_word_char(lowered[stop]))
+        )
+        pieces = []
+        keep_from = 0
+        for start, stop in spans:
+            if start > keep_from:
+                pieces.append(text[keep_from:start])
+            keep_from = max(keep_from, stop)
+        pieces.append(text[keep_from:])
+        return ''.join(pieces)
+    
+    def _apply_user_quirks(self, comment: str, profile: StyleProfile, emoji_roll: float) -> str:
+        """Add user-specific patterns (emoji_roll: uniform [0, 1) draw)"""
         
         # Add emoji sparingly if user uses them
-        emoji_usage = user_style.get('emoji_usage', 'none')
-        if emoji_usage in ['moderate', 'high'] and random.random() > 0.8:
-            if not any(c in comment for c in ['💯', '🎯', '👏', '💪', '🔥']):
-                emojis = ['💯', '🎯', '👏', '💪', '🔥']
-                comment += f" {random.choice(emojis)}"
+        if emoji_roll < profile.emoji_probability:
+            if not any(c in comment for c in profile.emojis):
+                comment += f" {self._rng.choice(profile.emojis)}"
         
         return comment
     
-    def _add_natural_elements(self, comment: str, user_style: Dict) -> str:
-        """Add human speech patterns"""
+    def _add_natural_elements(self, comment: str, profile: StyleProfile, starter_roll: float) -> str:
+        """Add human speech patterns (starter_roll: uniform [0, 1) draw)"""
         
         # Sometimes start with casual acknowledgment
-        if random.random() > 0.75:
-            starters = ['Yep.', 'True.', 'Exactly.', 'Yeah,', 'Totally.']
-            if not any(comment.startswith(s) for s in ['This', 'That', 'Your', 'The', 'It']):
-                comment = f"{random.choice(starters)} {comment}"
+        if starter_roll < profile.starter_probability:
+            if not comment.startswith(('This', 'That', 'Your', 'The', 'It')):
+                comment = f"{self._rng.choice(profile.starters)} {comment}"
         
         return comment
     
-    def _adjust_length(self, comment: str, user_style: Dict) -> str:
+    def _adjust_length(self, comment: str, profile: StyleProfile) -> str:
         """CRITICAL: Enforce SHORT, human-like length"""
         
-        words = comment.split()
-        word_count = len(words)
-        
-        # HARD LIMIT: 50 words max
-        if word_count > 50:
-            # Cut aggressively at sentence boundaries
-            sentences = re.split(r'[.!?]+', comment)
-            sentences = [s.strip() for s in sentences if s.strip()]
-            
-            # Keep only first 1-2 sentences
-            kept = []
-            current_words = 0
-            
-            for sent in sentences[:3]:  # Check first 3 sentences max
-                sent_words = len(sent.split())
-                if current_words + sent_words <= 45:
-                    kept.append(sent)
-                    current_words += sent_words
-                else:
+        # HARD LIMIT: 50 words max. Most comments are well within it and
+        # (brief is good, Gemini handles the too-short case) are kept as is
+        if len(comment.split()) <= profile.max_words:
+            return comment.strip()
+        
+        # Cut aggressively at sentence boundaries: keep only first 1-2
+        # sentences, each tokenized once into (sentence, word count)
+        sentences = []
+        for match in self._SENTENCE_PART_RE.finditer(comment):
+            sent = match.group(1).strip()
+            if sent:
+                sentences.append((sent, len(sent.split())))
+                if len(sentences) == 3:  # Check first 3 sentences max
                     break
-            
-            if kept:
-                comment = '. '.join(kept)
-                if not comment.endswith(('.', '!', '?')):
-                    comment += '.'
-        
-        # Minimum 15 words (too short looks spam)
-        if len(words) < 15 and len(words) > 5:
-            # Keep as is - brief is good
-            pass
-        elif len(words) <= 5:
-            # Too short, might need more context
-            # But don't force it - Gemini should handle this
-            pass
-        
-        return comment.strip()
         
-        return comment
\ No newline at end of file
+        kept = []
+        current_words = 0
+        for sent, sent_words in sentences:
+            if current_words + sent_words > profile.trim_words:
+                break
+            kept.append(sent)
+            current_words += sent_words
+        
+        if not kept:
+            return comment.strip()
+        # Kept sentences are stripped of their punctuation, so always close
+        return '. '.join(kept) + '.'
\ No newline at end of file
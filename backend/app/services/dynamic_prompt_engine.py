@@ -3,9 +3,22 @@ ULTIMATE Dynamic Prompt Engine - Uses Complete Voice Profile
 Leverages ALL 82+ fields from user JSON for authentic voice matching
 """
 
-from typing import Dict, List
-import json
+from cachetools import LRUCache
+from typing import Dict, List, Optional
+from app.core import json_codec
 import re
+import threading
+from itertools import islice
+
+
+def _join(items, k: int = 5, sep: str = ", ") -> str:
+    """Join the first k items without slicing a copy of the list"""
+    return sep.join(map(str, islice(items or (), k)))
+
+
+def _qjoin(items, k: int = 5, sep: str = ", ") -> str:
+    """Like _join, but each item is wrapped in double quotes"""
+    return sep.join(f'"{x}"' for x in islice(items or (), k))
 
 class DynamicPromptEngine:
     """
@@ -110,6 +123,23 @@ class DynamicPromptEngine:
         
         return available_angles[0]
     
+    # Static instruction, identical across requests (sent as the system prompt)
+    SYSTEM_PROMPT = "You are generating a LinkedIn comment in Vidhant Jain's EXACT voice."
+    
+    # Profile sections the voice prompt reads (its cache key covers exactly these)
+    VOICE_PROFILE_FIELDS = (
+        "basic_info", "core_voice_fingerprint", "rhythm_metrics", "cohesion_signature",
+        "punctuation_profile", "voice_markers", "sentence_structure", "generation_recipe",
+        "real_comment_examples", "common_phrases", "personality_traits",
+        "engagement_patterns", "specificity_patterns", "professional"
+    )
+    
+    def __init__(self):
+        # Rendered voice sections per profile: a user's profile is stable
+        # across requests, so repeat generations skip the rebuild
+        self._voice_prompt_cache = LRUCache(maxsize=256)
+        self._voice_prompt_lock = threading.Lock()
+    
     def build_ultimate_prompt(
         self,
         post_content: str,
@@ -122,18 +152,38 @@ class DynamicPromptEngine:
         Build ULTIMATE prompt using ALL user profile data
         Uses complete JSON structure with 82+ fields
         """
+        voice_prompt = self.build_voice_profile_prompt(user_profile)
+        post_prompt = self.build_post_prompt(post_content, post_context, sentiment, angle)
+        return f"{self.SYSTEM_PROMPT}\n\n{voice_prompt}\n{post_prompt}"
+    
+    def build_voice_profile_prompt(self, user_profile: Dict, cache_key: Optional[str] = None) -> str:
+        """
+        Build the voice-profile section (depends only on the user)
+        Stable across posts, so it can sit behind a prompt-cache breakpoint
         
-        # Auto-detect
-        if not sentiment:
-            sentiment = self.detect_sentiment(post_content)
-        if not angle:
-            angle = self.select_best_angle(sentiment, post_context)
+        cache_key: caller's stable hash of the source profile, if it has one
+        (skips re-serializing the voice fields)
+        """
+        key = cache_key or json_codec.dumps(
+            {field: user_profile.get(field) for field in self.VOICE_PROFILE_FIELDS},
+            sort_keys=True,
+            default=str
+        )
+        with self._voice_prompt_lock:
+            prompt = self._voice_prompt_cache.get(key)
+        if prompt is None:
+            prompt = self._render_voice_profile_prompt(user_profile)
+            with self._voice_prompt_lock:
+                self._voice_prompt_cache[key] = prompt
+        return prompt
+    
+    def _render_voice_profile_prompt(self, user_profile: Dict) -> str:
+        """Render the voice-profile section from scratch"""
         
         # Extract COMPLETE user data
         basic = user_profile.get("basic_info", {})
         core_voice = user_profile.get("core_voice_fingerprint", {})
         rhythm = user_profile.get("rhythm_metrics", {})
-        lexical = user_profile.get("lexical_signature", {})
         cohesion = user_profile.get("cohesion_signature", {})
         punctuation = user_profile.get("punctuation_profile", {})
         voice_markers = user_profile.get("voice_markers", {})
@@ -165,13 +215,6 @@ class DynamicPromptEngine:
         else:
             exp_str = "Experienced professional"
         
-        # Get post details
-        key_details = self._extract_key_details(post_content, post_context)
-        post_type = post_context.get("post_type", "general")
-        is_achievement = post_context.get("is_achievement", False)
-        achievement_type = post_context.get("achievement_type", "none")
-        company = post_context.get("company_mentioned", "")
-        
         # Get rhythm metrics
         sentence_length = rhythm.get("sentence_length_mean_words", {})
         target_length = sentence_length.get("target", 53)
@@ -186,27 +229,7 @@ class DynamicPromptEngine:
         discourse_markers = cohesion.get("discourse_marker_variety", {}).get("common_markers", 
             ["and", "so", "because", "then", "also", "but"])
         
-        # Build THE ULTIMATE PROMPT
-        prompt = f"""You are generating a LinkedIn comment in Vidhant Jain's EXACT voice.
-
-{'='*70}
-POST ANALYSIS
-{'='*70}
-Post Content: {post_content[:800]}
-
-Detected Sentiment: {sentiment}
-Post Type: {post_type}
-Is Achievement: {is_achievement}
-Company: {company or "N/A"}
-Key Details: {key_details}
-
-{'='*70}
-SELECTED ANGLE: {angle}
-{'='*70}
-
-{self._get_angle_instruction(angle, sentiment, is_achievement, key_details)}
-
-{'='*70}
+        return f"""{'='*70}
 YOUR COMPLETE VOICE PROFILE
 {'='*70}
 
@@ -214,13 +237,13 @@ YOUR COMPLETE VOICE PROFILE
 Name: {basic.get('name', 'Professional')}
 Archetype: {basic.get('voice_archetype', 'direct_operator')}
 Tone: {core_voice.get('tone', 'direct, no-fluff, operator-focused')}
-Personality: {', '.join(personality[:5])}
+Personality: {_join(personality)}
 
 💼 YOUR EXPERIENCE (USE THIS!):
 {exp_str}
 
 🎓 YOUR EXPERTISE:
-{', '.join(expertise[:5])}
+{_join(expertise)}
 
 📊 YOUR DATA POINTS (INJECT THESE NATURALLY):
 {self._format_data_points(specificity)}
@@ -229,7 +252,7 @@ Personality: {', '.join(personality[:5])}
 {self._format_examples(real_examples[:4])}
 
 🗣️ YOUR SIGNATURE PHRASES (USE THESE):
-{', '.join(f'"{p}"' for p in common_phrases[:5])}
+{_qjoin(common_phrases)}
 
 {'='*70}
 EXACT GENERATION RECIPE (FOLLOW PRECISELY!)
@@ -242,7 +265,7 @@ EXACT GENERATION RECIPE (FOLLOW PRECISELY!)
 
 🔗 CONNECTIVES (CRITICAL - YOUR SIGNATURE!):
 - Target density: {connective_target} ({int(connective_target * target_length)} connectives in {target_length} words)
-- Use: {', '.join(f'"{m}"' for m in discourse_markers[:5])}
+- Use: {_qjoin(discourse_markers)}
 - Style: {recipe.get('glue', '3-5 "and" + 1 "because" + optional "then"')}
 
 ✏️ PUNCTUATION RULES (STRICT):
@@ -281,7 +304,7 @@ CRITICAL REQUIREMENTS
 3. NO question marks, NO exclamation marks
 4. MINIMAL commas (0-1 max)
 5. Reference YOUR experience: {exp_str[:80]}...
-6. Use YOUR phrases: {', '.join(common_phrases[:3])}
+6. Use YOUR phrases: {_join(common_phrases, 3)}
 7. Inject data naturally: {specificity.get('data_usage', 'specific numbers')}
 
 ❌ NEVER DO:
@@ -291,6 +314,45 @@ CRITICAL REQUIREMENTS
 4. Excessive qualifiers ("just", "simply", "really")
 5. Politeness formulae ("Thanks in advance")
 6. Break the rhythm (must be {min_length}-{max_length} words!)
+"""
+    
+    def build_post_prompt(
+        self,
+        post_content: str,
+        post_context: Dict,
+        sentiment: str = None,
+        angle: str = None
+    ) -> str:
+        """Build the post-specific section (changes on every request)"""
+        
+        # Auto-detect
+        if not sentiment:
+            sentiment = self.detect_sentiment(post_content)
+        if not angle:
+            angle = self.select_best_angle(sentiment, post_context)
+        
+        # Get post details
+        key_details = self._extract_key_details(post_content, post_context)
+        post_type = post_context.get("post_type", "general")
+        is_achievement = post_context.get("is_achievement", False)
+        company = post_context.get("company_mentioned", "")
+        
+        return f"""{'='*70}
+POST ANALYSIS
+{'='*70}
+Post Content: {post_content[:800]}
+
+Detected Sentiment: {sentiment}
+Post Type: {post_type}
+Is Achievement: {is_achievement}
+Company: {company or "N/A"}
+Key Details: {key_details}
+
+{'='*70}
+SELECTED ANGLE: {angle}
+{'='*70}
+
+{self._get_angle_instruction(angle, sentiment, is_achievement, key_details)}
 
 {'='*70}
 NOW GENERATE ONE COMMENT
@@ -305,8 +367,6 @@ Write ONE comment that:
 
 Output ONLY the comment text, nothing else.
 """
-        
-        return prompt
     
     def _get_angle_instruction(self, angle: str, sentiment: str, is_achievement: bool, details: str) -> str:
         """Get specific instruction for selected angle"""
@@ -427,7 +487,7 @@ Use your operator lens, reference specific details, stay authentic to your voice
         """Format user's data points for injection"""
         number_examples = specificity.get("number_style", [])
         if number_examples:
-            return "\n".join(f"   - {ex}" for ex in number_examples[:6])
+            return "\n".join(f"   - {ex}" for ex in islice(number_examples, 6))
         return "   - Use specific metrics from your experience"
     
     def _format_examples(self, examples: List[Dict]) -> str:
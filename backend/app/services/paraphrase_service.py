@@ -3,9 +3,13 @@ Paraphrase Service using Custom Humanizer API
 Adds extra humanization layer by paraphrasing generated comments
 """
 import requests
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -23,6 +27,19 @@ class ParaphraseService:
         self.password = getattr(settings, 'HUMANIZER_BOT_AUTH_PASSWORD', None)
         self.enabled = bool(self.username and self.password)
         
+        # Keep-alive session; 429/503 are retried with exponential backoff
+        # honouring Retry-After, then surface as a normal response
+        retry = Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=(429, 503),
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(max_retries=retry))
+        
         if self.enabled:
             logger.info("✓ Humanizer API service enabled")
         else:
@@ -61,7 +78,7 @@ class ParaphraseService:
             # Use Basic Auth
             auth = HTTPBasicAuth(self.username, self.password)
             
-            response = requests.post(
+            response = self.session.post(
                 self.api_url,
                 json=payload,
                 headers=headers,
@@ -128,6 +145,15 @@ class ParaphraseService:
                     pass
             return text  # Return original on error
     
+    async def paraphrase_async(self, text: str, mode: str = "standard") -> Optional[str]:
+        """
+        Awaitable paraphrase for async callers
+        
+        The API answers in the same response (no job polling), so this just
+        moves the blocking request off the event loop.
+        """
+        return await asyncio.to_thread(self.paraphrase, text, mode)
+    
     def paraphrase_batch(self, texts: list, mode: str = "standard") -> list:
         """
         Humanize multiple texts
@@ -139,14 +165,23 @@ class ParaphraseService:
         Returns:
             List of humanized texts (originals returned if humanization fails)
         """
-        results = []
+        if len(texts) <= 1 or not self.enabled:
+            return [self.paraphrase(text, mode=mode) for text in texts]
         
-        for i, text in enumerate(texts, 1):
-            logger.debug(f"Humanizing comment {i}/{len(texts)}")
-            humanized = self.paraphrase(text, mode=mode)
-            results.append(humanized)
-        
-        return results
+        # Requests are independent: run them side by side so the batch costs
+        # one round-trip instead of len(texts)
+        logger.debug(f"Humanizing {len(texts)} comments concurrently")
+        with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+            return list(pool.map(lambda text: self.paraphrase(text, mode=mode), texts))
+    
+    async def paraphrase_batch_async(self, texts: list, mode: str = "standard") -> list:
+        """
+        Awaitable paraphrase_batch: every text is sent concurrently, so the
+        batch costs one round-trip (originals returned if humanization fails)
+        """
+        if not self.enabled:
+            return list(texts)
+        return list(await asyncio.gather(*(self.paraphrase_async(text, mode) for text in texts)))
     
     def paraphrase_with_fallback(self, text: str, modes: list = None) -> str:
         """
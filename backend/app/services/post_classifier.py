@@ -0,0 +1,205 @@
+"""
+Post Classifier
+LinkedIn post type detection without an LLM call: keyword matching, shared by
+the Gemini and OpenAI generators, plus an optional embedding classifier
+"""
+from typing import Any, Callable, Dict, Optional
+import re
+import threading
+
+# Only EmbeddingPostClassifier needs numpy, and it is only built when the
+# semantic cache (which requires numpy) is enabled
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Optional: one linear-time pass over the post however many keywords there are
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Categories in priority order: a post matching several gets the first one
+_CATEGORY_KEYWORDS = (
+    ("question", ("?", "what do you think", "thoughts?", "how do you", "which", "recommendations")),
+    ("achievement", ("excited to", "proud to", "happy to announce", "achieved", "launched", "released", "thrilled")),
+    ("lesson", ("failed", "mistake", "learned", "lesson", "lost", "tough")),
+    ("tips", ("tip", "tips:", "advice", "how to", "guide", "steps", "here's how")),
+    ("opinion", ("i think", "in my opinion", "unpopular", "controversial", "hot take")),
+    ("news", ("just released", "breaking", "announced", "update:", "news")),
+)
+
+_CATEGORY_ANALYSIS = {
+    "question": {
+        "approaches": ["answer_directly", "share_experience", "ask_followup"],
+        "tone": "helpful"
+    },
+    "achievement": {
+        "approaches": ["congratulate", "ask_details", "relate_experience"],
+        "tone": "celebratory"
+    },
+    "lesson": {
+        "approaches": ["empathize", "share_similar", "highlight_growth"],
+        "tone": "supportive"
+    },
+    "tips": {
+        "approaches": ["thank_add_tip", "ask_question", "share_result"],
+        "tone": "engaging"
+    },
+    "opinion": {
+        "approaches": ["agree_expand", "polite_counter", "add_perspective"],
+        "tone": "thoughtful"
+    },
+    "news": {
+        "approaches": ["react_implications", "ask_question", "share_perspective"],
+        "tone": "informative"
+    },
+    "story": {
+        "approaches": ["empathize", "share_similar", "highlight_lesson"],
+        "tone": "supportive"
+    },
+    "general": {
+        "approaches": ["engage", "question", "relate"],
+        "tone": "thoughtful"
+    }
+}
+
+# One alternation with a named group per category. The lookahead makes every
+# offset a candidate, so overlapping keywords are all seen in a single scan
+_CATEGORY_RE = re.compile(
+    "(?=" + "|".join(
+        f"(?P<{category}>" + "|".join(re.escape(word) for word in words) + ")"
+        for category, words in _CATEGORY_KEYWORDS
+    ) + ")"
+)
+_CATEGORY_RANK = {category: rank for rank, (category, _) in enumerate(_CATEGORY_KEYWORDS)}
+
+
+def _build_keyword_automaton():
+    """Aho-Corasick automaton mapping each keyword to its category rank (None if unavailable)"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    ranks = {}
+    for rank, (_, words) in enumerate(_CATEGORY_KEYWORDS):
+        for word in words:
+            ranks.setdefault(word, rank)
+    automaton = ahocorasick.Automaton()
+    for word, rank in ranks.items():
+        automaton.add_word(word, rank)
+    automaton.make_automaton()
+    return automaton
+
+
+# Preferred when pyahocorasick is installed (_CATEGORY_RE is the fallback)
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+
+def classify_post(post_content: str) -> Dict:
+    """{"type", "approaches", "tone"} for the highest-priority keyword category present"""
+    content_lower = post_content.lower()
+    best_rank = len(_CATEGORY_KEYWORDS)
+    if _KEYWORD_AUTOMATON is not None:
+        for _, rank in _KEYWORD_AUTOMATON.iter(content_lower):
+            best_rank = min(best_rank, rank)
+            if best_rank == 0:
+                break
+    else:
+        for match in _CATEGORY_RE.finditer(content_lower):
+            best_rank = min(best_rank, _CATEGORY_RANK[match.lastgroup])
+            if best_rank == 0:
+                break
+    
+    post_type = _CATEGORY_KEYWORDS[best_rank][0] if best_rank < len(_CATEGORY_KEYWORDS) else "general"
+    return _analysis_for(post_type)
+
+
+def _analysis_for(post_type: str) -> Dict:
+    analysis = _CATEGORY_ANALYSIS[post_type]
+    return {
+        "type": post_type,
+        "approaches": list(analysis["approaches"]),
+        "tone": analysis["tone"]
+    }
+
+
+# A few typical posts per type; their mean embedding is the type's centroid
+_SEED_POSTS = {
+    "question": (
+        "What tools do you use to manage your team's projects? Looking for recommendations.",
+        "How do you handle burnout when you're leading a startup? Curious what works for others.",
+        "Which would you pick for a first hire: a generalist or a specialist?",
+    ),
+    "achievement": (
+        "Excited to announce that we just closed our Series A round!",
+        "Proud to share that I've been promoted to Head of Engineering.",
+        "Thrilled that our product launched today after 18 months of work.",
+    ),
+    "lesson": (
+        "I made a huge mistake hiring too fast last year. Here's what I learned.",
+        "We failed to find product-market fit and lost $200K. The lessons were expensive.",
+        "The toughest lesson of my career came from a project that went wrong.",
+    ),
+    "story": (
+        "Five years ago I was sleeping on a friend's couch with no job and no plan.",
+        "My first manager told me something I still think about every day.",
+        "It was 2am when the phone rang and our biggest customer was about to churn.",
+    ),
+    "tips": (
+        "5 tips for writing cold emails that actually get replies:",
+        "Here's how to prepare for a system design interview, step by step.",
+        "My advice to new managers: a simple guide to your first 90 days.",
+    ),
+    "opinion": (
+        "Unpopular opinion: most meetings should be emails.",
+        "I think remote work is better for deep work, and here's why.",
+        "Hot take: hustle culture is killing good engineering teams.",
+    ),
+    "news": (
+        "Breaking: the EU just announced new rules for AI companies.",
+        "Big update: OpenAI released a new model this morning.",
+        "The latest industry report shows hiring in tech slowed this quarter.",
+    ),
+}
+
+
+class EmbeddingPostClassifier:
+    """
+    Nearest-centroid post type classifier over normalized sentence embeddings
+    
+    Uses the embed function of the semantic cache, so the post vector already
+    computed for the cache lookup classifies the post at no extra cost.
+    Centroids are embedded once, on first use.
+    """
+    
+    # Below this cosine similarity the keyword classifier decides instead
+    MIN_CONFIDENCE = 0.4
+    
+    def __init__(self, embed: Callable[[str], Any]):
+        self._embed = embed
+        self._types = None
+        self._centroids = None
+        self._lock = threading.Lock()
+    
+    def classify(self, vector) -> Optional[Dict]:
+        """{"type", "approaches", "tone"} of the closest centroid, None if not confident"""
+        self._ensure_centroids()
+        scores = self._centroids @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.MIN_CONFIDENCE:
+            return None
+        return _analysis_for(self._types[best])
+    
+    def _ensure_centroids(self) -> None:
+        with self._lock:
+            if self._centroids is not None:
+                return
+            types = []
+            rows = []
+            for post_type, seeds in _SEED_POSTS.items():
+                centroid = np.mean([self._embed(seed) for seed in seeds], axis=0)
+                rows.append(centroid / np.linalg.norm(centroid))
+                types.append(post_type)
+            self._types = types
+            self._centroids = np.vstack(rows).astype("float32")
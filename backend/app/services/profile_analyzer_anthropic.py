@@ -8,12 +8,16 @@ STAGE 3: Ready for Comment Generation
 from anthropic import Anthropic
 from typing import Dict, List, Optional
 from app.core.config import settings
+from app.core import json_codec
 import json
 import logging
 import re
 
 logger = logging.getLogger(__name__)
 
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_CONTROL_CHARS_RE = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
 
 class ProfileAnalyzer:
     """
@@ -85,9 +89,7 @@ class ProfileAnalyzer:
             return complete_profile
             
         except Exception as e:
-            logger.error(f"STAGE 1 ERROR: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"STAGE 1 ERROR: {str(e)}")
             return self._default_user_profile()
     
     def _load_json_profile(self, user_data: Dict) -> Dict:
@@ -248,7 +250,7 @@ Use extended thinking to find subtle patterns."""
             
             # Clean and parse JSON
             response_text = self._clean_json(response_text)
-            insights = json.loads(response_text)
+            insights = json_codec.loads(response_text)
             
             logger.info(f"   ✓ Claude found {len(insights.get('discovered_patterns', []))} unique patterns")
             
@@ -359,7 +361,7 @@ Base analysis on ACTUAL profile content provided above."""
                     response_text += block.text
             
             response_text = self._clean_json(response_text)
-            analysis = json.loads(response_text)
+            analysis = json_codec.loads(response_text)
             
             logger.info("✅ STAGE 2A COMPLETE: Target analyzed")
             logger.info(f"   Expertise: {', '.join(analysis.get('expertise_areas', [])[:2])}")
@@ -369,9 +371,7 @@ Base analysis on ACTUAL profile content provided above."""
             return analysis
             
         except Exception as e:
-            logger.error(f"STAGE 2A ERROR: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"STAGE 2A ERROR: {e}")
             return self._default_target()
     
     def analyze_post_context(
@@ -458,7 +458,7 @@ Return ONLY valid JSON:
                     response_text += block.text
             
             response_text = self._clean_json(response_text)
-            analysis = json.loads(response_text)
+            analysis = json_codec.loads(response_text)
             
             logger.info("✅ STAGE 2B COMPLETE: Post analyzed")
             logger.info(f"   Type: {analysis.get('post_type', 'Unknown')}")
@@ -469,9 +469,7 @@ Return ONLY valid JSON:
             return analysis
             
         except Exception as e:
-            logger.error(f"STAGE 2B ERROR: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"STAGE 2B ERROR: {e}")
             return self._default_post([])
     
     # ==========================================
@@ -550,27 +548,16 @@ Return ONLY valid JSON:
             logger.error("Empty response from Claude")
             return "{}"
         
-        # Remove markdown
-        if '```json' in text:
-            text = text.split('```json')[1].split('```')[0]
-        elif '```' in text:
-            text = text.split('```')[1].split('```')[0]
-        
-        text = text.strip()
-        start = text.find('{')
-        end = text.rfind('}')
-        
-        if start != -1 and end != -1:
-            text = text[start:end+1]
-        else:
+        # First balanced object (markdown fences and surrounding prose fall away)
+        obj = json_codec.extract_object(text)
+        if obj is None:
             logger.error(f"No JSON found: {text[:100]}")
             return "{}"
         
         # Clean up
-        text = re.sub(r',\s*}', '}', text)
-        text = re.sub(r',\s*]', ']', text)
-        text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
-        text = text.replace('\\"', '"')
+        text = _TRAILING_COMMA_RE.sub(r'\1', obj)
+        text = _CONTROL_CHARS_RE.sub('', text)
+        text = text.replace('\\"', '"')  # Fix escaped quotes
         
         return text
     
@@ -7,12 +7,17 @@ STAGE 3: Ready for Comment Generation
 import google.generativeai as genai
 from typing import Dict, List
 from app.core.config import settings
+from app.core.gemini_client import get_generative_model
+from app.core import json_codec
 import json
 import logging
 import re
 
 logger = logging.getLogger(__name__)
 
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_CONTROL_CHARS_RE = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
 
 class ProfileAnalyzer:
     """
@@ -33,8 +38,7 @@ class ProfileAnalyzer:
     """
     
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(settings.GEMINI_ANALYSIS_MODEL)
+        self.model = get_generative_model(settings.GEMINI_ANALYSIS_MODEL)
         logger.info("✓ ProfileAnalyzer ready - 3-stage intelligent analysis")
     
     # ==========================================
@@ -173,7 +177,7 @@ Base on ACTUAL comments."""
                 )
             )
             
-            insights = json.loads(self._clean_json(response.text))
+            insights = json_codec.loads(self._clean_json(response.text))
             logger.info(f"✓ LLM found {len(insights.get('unique_patterns', []))} unique patterns")
             return insights
             
@@ -299,7 +303,7 @@ Base analysis on ACTUAL profile content provided above."""
                 )
             )
             
-            analysis = json.loads(self._clean_json(response.text))
+            analysis = json_codec.loads(self._clean_json(response.text))
             
             logger.info("✅ STAGE 2A COMPLETE: Target analyzed")
             logger.info(f"   Expertise: {', '.join(analysis.get('expertise_areas', [])[:2])}")
@@ -310,9 +314,7 @@ Base analysis on ACTUAL profile content provided above."""
             
         except Exception as e:
             logger.error(f"STAGE 2A ERROR: {e}")
-            logger.error(f"Returning default target profile")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"Returning default target profile")
             return self._default_target()
     
     # ==========================================
@@ -375,7 +377,7 @@ Return JSON:
                 )
             )
             
-            analysis = json.loads(self._clean_json(response.text))
+            analysis = json_codec.loads(self._clean_json(response.text))
             analysis['extracted_facts'] = facts
             
             logger.info("✅ STAGE 2B COMPLETE: Post analyzed")
@@ -445,26 +447,15 @@ Return JSON:
             logger.error("Empty response from LLM")
             return "{}"
         
-        # Remove markdown
-        if '```json' in text:
-            text = text.split('```json')[1].split('```')[0]
-        elif '```' in text:
-            text = text.split('```')[1].split('```')[0]
-        
-        text = text.strip()
-        start = text.find('{')
-        end = text.rfind('}')
-        
-        if start != -1 and end != -1:
-            text = text[start:end+1]
-        else:
+        # First balanced object (markdown fences and surrounding prose fall away)
+        obj = json_codec.extract_object(text)
+        if obj is None:
             logger.error(f"No JSON found: {text[:100]}")
             return "{}"
         
         # Clean up
-        text = re.sub(r',\s*}', '}', text)
-        text = re.sub(r',\s*]', ']', text)
-        text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)  # Remove control chars
+        text = _TRAILING_COMMA_RE.sub(r'\1', obj)
+        text = _CONTROL_CHARS_RE.sub('', text)
         text = text.replace('\\"', '"')  # Fix escaped quotes
         
         return text
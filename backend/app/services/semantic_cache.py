@@ -0,0 +1,169 @@
+"""
+Semantic Comment Cache
+Reuses generated comments for near-duplicate posts: posts are embedded with
+a small local model and matched by cosine similarity (FAISS inner product
+over normalized vectors), scoped to the same user style
+"""
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core import json_codec
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Optional heavy dependencies: the cache disables itself without them
+try:
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    SEMANTIC_CACHE_AVAILABLE = True
+except ImportError:
+    SEMANTIC_CACHE_AVAILABLE = False
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of comment sets keyed by post embedding
+    
+    Rows live in an IndexIDMap over IndexFlatIP; the oldest rows are evicted
+    once maxsize is reached. Every stored row is appended to a JSONL sidecar
+    (vector included), which is replayed on startup; the sidecar is rewritten
+    with just the live rows once it holds twice maxsize lines.
+    """
+    
+    # Neighbours inspected per lookup before filtering on style
+    SEARCH_K = 8
+    
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        threshold: float = 0.92,
+        maxsize: int = 2048,
+        sidecar_path: Optional[str] = None
+    ):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.sidecar_path = os.path.expanduser(sidecar_path) if sidecar_path else None
+        self._model = None
+        self._index = None
+        self._rows: Dict[int, Dict] = {}
+        self._lines: Dict[int, str] = {}  # sidecar line per live row, for compaction
+        self._sidecar_lines = 0
+        self._order = deque()
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    def _ensure_loaded(self) -> None:
+        """Load the embedding model and replay the sidecar on first use"""
+        if self._model is not None:
+            return
+        self._model = SentenceTransformer(self.model_name)
+        dim = self._model.get_sentence_embedding_dimension()
+        self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+        
+        if self.sidecar_path:
+            try:
+                os.makedirs(os.path.dirname(self.sidecar_path) or ".", exist_ok=True)
+                # Only the newest maxsize rows would survive eviction anyway
+                lines = deque(maxlen=self.maxsize)
+                with open(self.sidecar_path, encoding="utf-8") as sidecar:
+                    for line in sidecar:
+                        lines.append(line)
+                        self._sidecar_lines += 1
+                for line in lines:
+                    row = json_codec.loads(line)
+                    self._add(np.asarray(row.pop("vector"), dtype="float32"), row, line)
+                logger.info(f"✓ Semantic cache restored {len(self._rows)} entries")
+                if self._sidecar_lines > len(self._rows):
+                    self._compact_sidecar()
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Semantic cache sidecar unreadable: {e}")
+    
+    def embed(self, text: str):
+        """Normalized embedding (CPU-bound: call from a worker thread)"""
+        with self._lock:
+            self._ensure_loaded()
+        return self._model.encode(text, normalize_embeddings=True).astype("float32")
+    
+    def lookup(self, vector, style_hash: str) -> Optional[List[Dict]]:
+        """Comments cached for the most similar post with the same style, if close enough"""
+        with self._lock:
+            if not self._rows:
+                return None
+            scores, ids = self._index.search(vector.reshape(1, -1), min(self.SEARCH_K, len(self._rows)))
+            for score, row_id in zip(scores[0], ids[0]):
+                if score < self.threshold:
+                    break
+                row = self._rows.get(int(row_id))
+                if row is not None and row["style"] == style_hash:
+                    logger.info(f"⚡ Semantic cache hit (similarity {score:.3f})")
+                    return [dict(comment) for comment in row["comments"]]
+        return None
+    
+    def add(self, vector, style_hash: str, comments: List[Dict]) -> None:
+        """Store a non-empty comment set for this post vector"""
+        if not comments:
+            return
+        row = {"style": style_hash, "comments": comments}
+        line = json_codec.dumps({**row, "vector": vector.tolist()}, default=str) + "\n"
+        with self._lock:
+            self._add(vector, row, line)
+            if self.sidecar_path:
+                try:
+                    with open(self.sidecar_path, "a", encoding="utf-8") as sidecar:
+                        sidecar.write(line)
+                    self._sidecar_lines += 1
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not append to semantic cache sidecar: {e}")
+                    return
+                # Evicted rows stay in the file until it is rewritten
+                if self._sidecar_lines > 2 * self.maxsize:
+                    self._compact_sidecar()
+    
+    def _add(self, vector, row: Dict, line: str) -> None:
+        """Insert a row, evicting the oldest beyond maxsize (lock held)"""
+        row_id = self._next_id
+        self._next_id += 1
+        self._index.add_with_ids(vector.reshape(1, -1), np.array([row_id], dtype="int64"))
+        self._rows[row_id] = row
+        self._lines[row_id] = line
+        self._order.append(row_id)
+        
+        while len(self._order) > self.maxsize:
+            oldest = self._order.popleft()
+            self._rows.pop(oldest, None)
+            self._lines.pop(oldest, None)
+            self._index.remove_ids(np.array([oldest], dtype="int64"))
+    
+    def _compact_sidecar(self) -> None:
+        """Rewrite the sidecar with only the live rows, oldest first (lock held)"""
+        tmp_path = self.sidecar_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as sidecar:
+                sidecar.writelines(self._lines[row_id] for row_id in self._order)
+            os.replace(tmp_path, self.sidecar_path)
+            self._sidecar_lines = len(self._order)
+            logger.info(f"✓ Semantic cache sidecar compacted to {self._sidecar_lines} entries")
+        except OSError as e:
+            logger.warning(f"⚠️ Could not compact semantic cache sidecar: {e}")
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Process-wide semantic cache (one embedding model), None when disabled/unavailable"""
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    if not SEMANTIC_CACHE_AVAILABLE:
+        logger.warning("⚠️ SEMANTIC_CACHE_ENABLED but sentence-transformers/faiss not installed")
+        return None
+    return SemanticCache(
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+        sidecar_path=settings.SEMANTIC_CACHE_PATH
+    )
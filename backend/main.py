@@ -2,17 +2,24 @@
 FastAPI Main Application
 LinkedIn Comment Generator Backend
 """
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, HttpUrl
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime
+import asyncio
+import inspect
+import json
 import logging
+import sys
 
-from app.core.config import settings
+from app.core.config import get_settings, validate_settings
 from app.models.database import Base, User, Target, Post, GeneratedComment
 
+settings = get_settings()
+
 # Setup logging FIRST
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -60,8 +67,8 @@ generator_used = None
 # Try Anthropic first (Claude Sonnet 4.5)
 if settings.AI_PROVIDER == "anthropic" or (hasattr(settings, 'ANTHROPIC_API_KEY') and settings.ANTHROPIC_API_KEY):
     try:
-        from app.services.comment_generator_anthropic import CommentGenerator
-        comment_generator = CommentGenerator()
+        from app.services.comment_generator_anthropic import get_comment_generator
+        comment_generator = get_comment_generator()
         generator_used = "anthropic"
         logger.info("✓ Using Anthropic Claude Sonnet 4.5 for comment generation")
     except Exception as e:
@@ -104,6 +111,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def validate_configuration():
+    """Validate configuration once at server startup (not on import)"""
+    validate_settings()
+
+
+@app.on_event("shutdown")
+async def close_api_clients():
+    """Close pooled provider connections"""
+    # Only the modules something imported can hold a client
+    if "app.core.anthropic_client" in sys.modules:
+        from app.core.anthropic_client import close_client
+        await close_client()
+    if generator_used == "openai":
+        from app.core.openai_client import close_clients
+        await close_clients()
+
+
 # Initialize services (linkedin_service already initialized above)
 # profile_analyzer already initialized above
 # comment_generator initialized above with fallback chain
@@ -126,6 +152,10 @@ class CommentGenerationRequest(BaseModel):
     post_url: str
 
 
+class BatchGenerationRequest(BaseModel):
+    requests: List[CommentGenerationRequest]
+
+
 class ProfileResponse(BaseModel):
     user_id: int
     name: str
@@ -352,9 +382,7 @@ async def create_user_profile(request: ProfileRequest):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error loading user profile: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception("Error loading user profile")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -483,12 +511,99 @@ async def analyze_target(request: TargetAnalysisRequest):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error analyzing target: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception("Error analyzing target")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _store_generated_comment(request: CommentGenerationRequest, comment: dict):
+    """Record one generated comment in the history store"""
+    # ✅ FIX: Use 'variation_number' instead of 'variation'
+    comment_id = len(comments_db) + 1
+    comments_db[comment_id] = {
+        "id": comment_id,
+        "user_id": request.user_id,
+        "post_id": request.post_id,
+        "text": comment.get("text", ""),
+        "variation": comment.get("variation_number", 1),  # ✅ FIXED
+        "confidence": comment.get("confidence", 0.85),
+        "created_at": datetime.now()
+    }
+
+
+def _prepare_generation(request: CommentGenerationRequest):
+    """
+    Load user/post/target and build the generator inputs (steps 1-6)
+    Shared by the JSON and streaming generation endpoints
+    """
+    # Step 1: Get user data
+    if request.user_id not in users_db:
+        logger.error(f"User {request.user_id} not found in database")
+        raise HTTPException(status_code=404, detail=f"User {request.user_id} not found. Please create profile first.")
+    user = users_db[request.user_id]
+    
+    # Step 2: Get post data
+    if request.post_id not in posts_db:
+        logger.error(f"Post {request.post_id} not found in database")
+        raise HTTPException(status_code=404, detail=f"Post {request.post_id} not found. Please fetch posts first.")
+    post = posts_db[request.post_id]
+    
+    # Step 3: Get target data
+    target = targets_db.get(post["target_id"])
+    if not target:
+        logger.error(f"Target {post['target_id']} not found in database")
+        raise HTTPException(status_code=404, detail=f"Target not found. Please analyze target first.")
+    
+    logger.info("✓ All data found, building complete user profile...")
+    
+    # Step 4: Build COMPLETE user profile for generation
+    # This merges ALL data sources into one comprehensive profile
+    complete_user_profile = {
+        # ⭐ Core writing style (analyzed by ProfileAnalyzer)
+        **user["writing_style"],
+        
+        # ⭐ Professional data (easy access to expertise)
+        "professional": user.get("professional", {
+            "expertise_areas": [],
+            "experience": [],
+            "skills": [],
+            "industry": ""
+        }),
+        
+        # ⭐ Real examples (actual comments for reference)
+        "real_examples": user.get("real_examples", {
+            "comments": [],
+            "common_phrases": []
+        }),
+        
+        # ⭐ Raw profile data (complete JSON with 82+ fields)
+        "raw_profile": user.get("profile_data", {})
+    }
+    
+    # Log what we're passing to the generator
+    logger.info(f"✅ Complete profile assembled:")
+    logger.info(f"   - Writing style keys: {len(user['writing_style'])}")
+    logger.info(f"   - Professional fields: {len(complete_user_profile['professional'])}")
+    logger.info(f"   - Real examples: {len(complete_user_profile['real_examples'].get('comments', []))}")
+    logger.info(f"   - Raw profile sections: {len(complete_user_profile['raw_profile'])}")
+    logger.info(f"   - Total top-level keys: {len(complete_user_profile)}")
+    
+    # Step 5: Fetch post comments for context
+    existing_comments = linkedin_service.get_post_comments(
+        post["post_url"],
+        max_comments=settings.MAX_COMMENTS_ANALYZE
+    )
+    
+    # Step 6: Analyze post context
+    logger.info("🔍 Analyzing post context...")
+    post_context = profile_analyzer.analyze_post_context(
+        post,
+        existing_comments
+    )
+    logger.info(f"✅ Post context analyzed: {len(post_context)} fields")
+    
+    return user, target, post, complete_user_profile, post_context
+
+
 @app.post("/api/comments/generate", response_model=GeneratedCommentsResponse)
 async def generate_comments(request: CommentGenerationRequest):
     """
@@ -499,71 +614,7 @@ async def generate_comments(request: CommentGenerationRequest):
         logger.info(f"🎯 Generating comments for post {request.post_id}")
         logger.info(f"Request: user_id={request.user_id}, post_id={request.post_id}")
         
-        # Step 1: Get user data
-        if request.user_id not in users_db:
-            logger.error(f"User {request.user_id} not found in database")
-            raise HTTPException(status_code=404, detail=f"User {request.user_id} not found. Please create profile first.")
-        user = users_db[request.user_id]
-        
-        # Step 2: Get post data
-        if request.post_id not in posts_db:
-            logger.error(f"Post {request.post_id} not found in database")
-            raise HTTPException(status_code=404, detail=f"Post {request.post_id} not found. Please fetch posts first.")
-        post = posts_db[request.post_id]
-        
-        # Step 3: Get target data
-        target = targets_db.get(post["target_id"])
-        if not target:
-            logger.error(f"Target {post['target_id']} not found in database")
-            raise HTTPException(status_code=404, detail=f"Target not found. Please analyze target first.")
-        
-        logger.info("✓ All data found, building complete user profile...")
-        
-        # Step 4: Build COMPLETE user profile for generation
-        # This merges ALL data sources into one comprehensive profile
-        complete_user_profile = {
-            # ⭐ Core writing style (analyzed by ProfileAnalyzer)
-            **user["writing_style"],
-            
-            # ⭐ Professional data (easy access to expertise)
-            "professional": user.get("professional", {
-                "expertise_areas": [],
-                "experience": [],
-                "skills": [],
-                "industry": ""
-            }),
-            
-            # ⭐ Real examples (actual comments for reference)
-            "real_examples": user.get("real_examples", {
-                "comments": [],
-                "common_phrases": []
-            }),
-            
-            # ⭐ Raw profile data (complete JSON with 82+ fields)
-            "raw_profile": user.get("profile_data", {})
-        }
-        
-        # Log what we're passing to the generator
-        logger.info(f"✅ Complete profile assembled:")
-        logger.info(f"   - Writing style keys: {len(user['writing_style'])}")
-        logger.info(f"   - Professional fields: {len(complete_user_profile['professional'])}")
-        logger.info(f"   - Real examples: {len(complete_user_profile['real_examples'].get('comments', []))}")
-        logger.info(f"   - Raw profile sections: {len(complete_user_profile['raw_profile'])}")
-        logger.info(f"   - Total top-level keys: {len(complete_user_profile)}")
-        
-        # Step 5: Fetch post comments for context
-        existing_comments = linkedin_service.get_post_comments(
-            post["post_url"],
-            max_comments=settings.MAX_COMMENTS_ANALYZE
-        )
-        
-        # Step 6: Analyze post context
-        logger.info("🔍 Analyzing post context...")
-        post_context = profile_analyzer.analyze_post_context(
-            post,
-            existing_comments
-        )
-        logger.info(f"✅ Post context analyzed: {len(post_context)} fields")
+        user, target, post, complete_user_profile, post_context = _prepare_generation(request)
         
         # Step 7: Generate comments with COMPLETE data!
         logger.info("🚀 Generating comments with complete profile data...")
@@ -571,28 +622,23 @@ async def generate_comments(request: CommentGenerationRequest):
         logger.info(f"   - Target insights: {len(target['insights'])} keys")
         logger.info(f"   - Post context: {len(post_context)} keys")
         
-        generated = comment_generator.generate_comments(
+        generation_kwargs = dict(
             user_style=complete_user_profile,  # ⭐ ALL 82+ fields!
             target_profile=target["insights"],  # 10+ fields
             post_context=post_context,  # 12+ fields
             post_content=post["content"]
         )
+        if inspect.iscoroutinefunction(comment_generator.generate_comments):
+            generated = await comment_generator.generate_comments(**generation_kwargs)
+        else:
+            # Sync providers (OpenAI/Gemini) must not block the event loop
+            generated = await asyncio.to_thread(comment_generator.generate_comments, **generation_kwargs)
         
         logger.info(f"✅ Generated {len(generated)} comment variations")
         
         # Step 8: Store generated comments
-        # ✅ FIX: Use 'variation_number' instead of 'variation'
         for comment in generated:
-            comment_id = len(comments_db) + 1
-            comments_db[comment_id] = {
-                "id": comment_id,
-                "user_id": request.user_id,
-                "post_id": request.post_id,
-                "text": comment.get("text", ""),
-                "variation": comment.get("variation_number", 1),  # ✅ FIXED
-                "confidence": comment.get("confidence", 0.85),
-                "created_at": datetime.now()
-            }
+            _store_generated_comment(request, comment)
         
         # Step 9: Return results
         # ✅ FIX: Use 'variation_number' instead of 'variation'
@@ -625,12 +671,105 @@ async def generate_comments(request: CommentGenerationRequest):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error generating comments: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception("Error generating comments")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/comments/generate/stream")
+async def stream_comments(request: CommentGenerationRequest):
+    """
+    Same as /api/comments/generate, but sent as Server-Sent Events:
+    one `comment` event per variation as soon as it is ready, then `done`
+    """
+    logger.info(f"🎯 Streaming comments for post {request.post_id}")
+    user, target, post, complete_user_profile, post_context = _prepare_generation(request)
+    
+    generation_kwargs = dict(
+        user_style=complete_user_profile,
+        target_profile=target["insights"],
+        post_context=post_context,
+        post_content=post["content"]
+    )
+    
+    async def comment_source():
+        if hasattr(comment_generator, "generate_comments_stream"):
+            async for comment in comment_generator.generate_comments_stream(**generation_kwargs):
+                yield comment
+            return
+        # Providers without streaming: generate everything, then emit one by one
+        if inspect.iscoroutinefunction(comment_generator.generate_comments):
+            generated = await comment_generator.generate_comments(**generation_kwargs)
+        else:
+            generated = await asyncio.to_thread(comment_generator.generate_comments, **generation_kwargs)
+        for comment in generated:
+            yield comment
+    
+    async def event_stream():
+        count = 0
+        try:
+            async for comment in comment_source():
+                _store_generated_comment(request, comment)
+                count += 1
+                payload = CommentResponse(
+                    text=comment.get("text", ""),
+                    variation=comment.get("variation_number", count),
+                    confidence=comment.get("confidence", 0.85),
+                    approach=comment.get("approach", "context-aware")
+                )
+                yield f"event: comment\ndata: {payload.model_dump_json()}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming comments: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        
+        logger.info(f"✅ Streamed {count} comment variations")
+        yield f"event: done\ndata: {json.dumps({'count': count})}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post("/api/comments/generate/batch")
+async def queue_batch_generation(request: BatchGenerationRequest, background_tasks: BackgroundTasks):
+    """
+    Queue background (non-interactive) generation for many posts at once
+    Results land in /api/history/{user_id} when the batch finishes
+    """
+    if not hasattr(comment_generator, "generate_comments_batch"):
+        raise HTTPException(status_code=501, detail=f"Batch generation is not supported by {generator_used}")
+    
+    # Validate everything up front so bad ids fail the request, not the batch
+    prepared = [(item, _prepare_generation(item)) for item in request.requests]
+    
+    background_tasks.add_task(_run_batch_generation, prepared)
+    logger.info(f"📦 Queued batch generation for {len(prepared)} posts")
+    return {"status": "queued", "jobs": len(prepared)}
+
+
+async def _run_batch_generation(prepared):
+    """Background task: generate through the provider's batch path and store results"""
+    jobs = [
+        {
+            "user_style": complete_user_profile,
+            "target_profile": target["insights"],
+            "post_context": post_context,
+            "post_content": post["content"]
+        }
+        for _, (user, target, post, complete_user_profile, post_context) in prepared
+    ]
+    try:
+        if inspect.iscoroutinefunction(comment_generator.generate_comments_batch):
+            results = await comment_generator.generate_comments_batch(jobs)
+        else:
+            results = await asyncio.to_thread(comment_generator.generate_comments_batch, jobs)
+    except Exception as e:
+        logger.error(f"Batch generation failed: {str(e)}")
+        return
+    
+    for (item, _), generated in zip(prepared, results):
+        for comment in generated:
+            _store_generated_comment(item, comment)
+    logger.info(f"✅ Batch generation stored {sum(len(r) for r in results)} comments")
+
+
 @app.get("/api/history/{user_id}")
 async def get_history(user_id: int):
     """Get user's comment generation history"""
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test contraction ordering in the humanizer
+Negations must win over the pronoun phrase in front of them ("I won't", not "I'll not")
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.advanced_humanizer import AdvancedHumanizer
+
+# (input, expected) - none of these contain a casual connector, so no randomness
+test_cases = [
+    ("I will not stop now.", "I won't stop now."),
+    ("it is not easy.", "it isn't easy."),
+    ("you are not alone.", "you aren't alone."),
+    ("we are not there yet.", "we aren't there yet."),
+    ("They have not shipped it.", "They haven't shipped it."),
+    ("that is not the point.", "that isn't the point."),
+    ("I am not sure.", "I'm not sure."),
+    ("I will do it.", "I'll do it."),
+]
+
+
+def test_contractions():
+    """Every case must match exactly"""
+    humanizer = AdvancedHumanizer(seed=0)
+    failures = 0
+    
+    print("Testing contraction ordering...")
+    for text, expected in test_cases:
+        result = humanizer._apply_casual_replacements(text)
+        if result == expected:
+            print(f"✓ {text!r} -> {result!r}")
+        else:
+            failures += 1
+            print(f"❌ {text!r} -> {result!r} (expected {expected!r})")
+    
+    assert failures == 0, f"{failures} contraction case(s) failed"
+
+
+if __name__ == "__main__":
+    try:
+        test_contractions()
+    except AssertionError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+    print("\n✅ All tests passed!")